@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark .SPE reading and FITS writing on synthetic files
+
+    benchmark.py [-o result.json] [--cases FRAMESxYDIMxXDIM:DATATYPE,...]
+                 [--repeat N] [-j N] [--workdir DIR] [--keep]
+
+Synthetic .SPE are generated from the header layout ( `SpeHeaderLayout.encode` ),
+then every case is timed for
+    header:  SPE.loadSpeHeader
+    decode:  SPE.loadSpeImg of all frames
+    frames:  SPE.writeToFits, one FITS per frame
+    cube:    SPE.writeToFitsCube
+and the whole directory is converted by `speBatch.convertFiles` in -j processes.
+Each measurement runs in a fresh process, so its peak RSS is its own.
+Files are read back right after being written, mostly from page cache.
+Result is JSON, to compare releases on the same machine.
+"""
+
+import sys
+import os
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import numpy as np
+
+# frames x ydim x xdim : datatype (see SPE.SPE_DATATYPE)
+DEFAULT_CASES = "100x512x512:3,20x1024x1024:3,1000x64x256:3,50x512x512:1,50x512x512:0"
+HEADER_LOOPS = 2000
+
+def parseCase(case):
+    """ "FRAMESxYDIMxXDIM:DATATYPE" to (frames, ydim, xdim, datatype)
+    """
+    shape, sep, datatype = case.partition(":")
+    frames, ydim, xdim = map(int, shape.lower().split("x"))
+    return frames, ydim, xdim, int(datatype) if sep else 3
+
+def caseName(frames, ydim, xdim, datatype):
+    return "{}x{}x{}_dt{}".format(frames, ydim, xdim, datatype)
+
+def makeSpe(filename, frames, ydim, xdim, datatype = 3, seed = 0, headerfile = None):
+    """ write a synthetic .SPE, header from the layout, noisy ramp as data
+    """
+    from spe2fits import SPE
+    layout = SPE.getHeaderLayout(headerfile)
+    dtype = SPE.pixelDtype(datatype)
+    header = layout.encode({
+        'xdim': xdim,
+        'ydim': ydim,
+        'NumFrames': frames,
+        'datatype': datatype,
+        'exp_sec': 1.0,
+        'DetTemperature': -70.0,
+        'date': '01Jan2020',
+        'ExperimentTimeUTC': '120000',
+        })
+    rng = np.random.default_rng(seed)
+    if dtype.kind == 'f':
+        top = 1000.0
+    else:
+        top = min(np.iinfo(dtype).max, 60000)
+    ramp = np.linspace(0, top / 2, xdim, dtype = np.float64)
+    with open(filename, "wb") as fileObj:
+        fileObj.write(header)
+        for i in range(frames):
+            frame = ramp + rng.random((ydim, xdim)) * (top / 2)
+            fileObj.write(frame.astype(dtype).tobytes())
+
+def peakRss():
+    """ peak resident set size of this process and its children, in KiB
+    On Windows (no resource module) peak working set of this process only,
+    if psutil is installed, otherwise None
+    """
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        peak = getattr(psutil.Process().memory_info(), "peak_wset", None)
+        return peak // 1024 if peak is not None else None
+    scale = 1024 if sys.platform == "darwin" else 1 # bytes on macOS
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) // scale
+
+def formatResult(result):
+    """ one line of a measurement, peak RSS "-" where it is unknown
+    """
+    rss = result["peak_rss_kib"]
+    return "{case:24} {stage:10} {MB_s:10.1f} MB/s {frames_s:10.1f} frames/s" \
+            " {rss:>8} KiB".format(rss = "-" if rss is None else rss, **result)
+
+def _runStage(stage, filename, outputDir, jobs):
+    """ one measurement, in its own process
+    return {"seconds", "bytes", "frames"[, "files"], "peak_rss_kib"}
+    """
+    from spe2fits import SPE
+    if stage == "directory":
+        from speBatch import convertFiles, expandSources, FAILED
+        sources = list(expandSources([filename]))
+        nbytes = sum(os.path.getsize(name) - SPE.SPE_DATA_OFFSET for name, prefix in sources)
+        frames = 0
+        for name, prefix in sources:
+            with open(name, "rb") as fileObj:
+                frames += SPE.loadSpeHeader(fileObj, SPE.getHeaderLayout())['NumFrames'][0]
+        start = time.perf_counter()
+        for name, status, result in convertFiles(sources, outputDir, jobs = jobs,
+                output_verify = "ignore"):
+            if status == FAILED:
+                raise RuntimeError("{}: {}".format(name, result))
+        seconds = time.perf_counter() - start
+        return { "seconds": seconds, "bytes": nbytes, "frames": frames,
+                "files": len(sources), "peak_rss_kib": peakRss() }
+
+    speHandler = SPE(filename)
+    try:
+        nbytes = speHandler.imgCount * speHandler.imgSize
+        frames = speHandler.imgCount
+        outPrefix = os.path.join(outputDir, "out")
+        if stage == "header":
+            layout = SPE.getHeaderLayout()
+            with open(filename, "rb") as fileObj:
+                start = time.perf_counter()
+                for i in range(HEADER_LOOPS):
+                    SPE.loadSpeHeader(fileObj, layout)
+                seconds = time.perf_counter() - start
+            return { "seconds": seconds, "bytes": HEADER_LOOPS * SPE.SPE_DATA_OFFSET,
+                    "frames": 0, "headers": HEADER_LOOPS, "peak_rss_kib": peakRss() }
+        start = time.perf_counter()
+        if stage == "decode":
+            speHandler.loadSpeImg(None)
+        elif stage == "frames":
+            speHandler.spe2fits(mode = "frames", outPrefix = outPrefix,
+                    output_verify = "ignore")
+        elif stage == "cube":
+            speHandler.writeToFitsCube(outPrefix = outPrefix, output_verify = "ignore")
+        else:
+            raise ValueError("unknown stage: {}".format(stage))
+        seconds = time.perf_counter() - start
+        return { "seconds": seconds, "bytes": nbytes, "frames": frames,
+                "peak_rss_kib": peakRss() }
+    finally:
+        speHandler.close()
+
+def measure(stage, filename, outputDir, jobs = 1, repeat = 1):
+    """ best of repeat runs of stage, each in a fresh process
+    """
+    context = multiprocessing.get_context("spawn")
+    best = None
+    for i in range(repeat):
+        shutil.rmtree(outputDir, ignore_errors = True)
+        os.makedirs(outputDir)
+        with ProcessPoolExecutor(max_workers = 1, mp_context = context) as executor:
+            result = executor.submit(_runStage, stage, filename, outputDir, jobs).result()
+        if best is None or result["seconds"] < best["seconds"]:
+            peaks = [ peak for peak in (result["peak_rss_kib"],
+                best["peak_rss_kib"] if best else None) if peak is not None ]
+            best = dict(result, peak_rss_kib = max(peaks) if peaks else None)
+    seconds = max(best["seconds"], 1e-9)
+    best["MB_s"] = best["bytes"] / seconds / 1e6
+    best["frames_s"] = best["frames"] / seconds
+    if "headers" in best:
+        best["headers_s"] = best["headers"] / seconds
+    if "files" in best:
+        best["files_s"] = best["files"] / seconds
+    shutil.rmtree(outputDir, ignore_errors = True)
+    return best
+
+def environment():
+    from spe2fits import VERSION
+    try:
+        from astropy import __version__ as astropyVersion
+    except ImportError:
+        astropyVersion = None
+    return {
+            "spe2fits": VERSION,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "astropy": astropyVersion,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            }
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+            description = "Benchmark .SPE to FITS conversion on synthetic files")
+    parser.add_argument("-o", "--output", default = None,
+            help = "JSON result file, default is stdout")
+    parser.add_argument("--cases", default = DEFAULT_CASES,
+            help = "comma separated FRAMESxYDIMxXDIM:DATATYPE, default %(default)s")
+    parser.add_argument("--stages", default = "header,decode,frames,cube,directory",
+            help = "comma separated stages, default %(default)s")
+    parser.add_argument("--repeat", type = int, default = 3,
+            help = "runs per measurement, the fastest is reported")
+    parser.add_argument("-j", "--jobs", type = int, default = 0,
+            help = "processes of directory conversion (0 for all cores)")
+    parser.add_argument("--workdir", default = None,
+            help = "directory for synthetic and output files, default is temporary")
+    parser.add_argument("--keep", action = "store_true",
+            help = "keep synthetic files in workdir")
+    args = parser.parse_args(argv)
+
+    cases = [ parseCase(case) for case in args.cases.split(",") if case ]
+    stages = [ stage for stage in args.stages.split(",") if stage ]
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    workdir = args.workdir or tempfile.mkdtemp(prefix = "spe2fits-bench-")
+    srcDir = os.path.join(workdir, "spe")
+    outputDir = os.path.join(workdir, "out")
+    os.makedirs(srcDir, exist_ok = True)
+
+    results = []
+    try:
+        for case in cases:
+            filename = os.path.join(srcDir, caseName(*case) + ".SPE")
+            if not os.path.exists(filename):
+                makeSpe(filename, *case)
+        for case in cases:
+            filename = os.path.join(srcDir, caseName(*case) + ".SPE")
+            for stage in stages:
+                if stage == "directory":
+                    continue
+                result = measure(stage, filename, outputDir, repeat = args.repeat)
+                result.update(case = caseName(*case), stage = stage)
+                results.append(result)
+                print(formatResult(result), file = sys.stderr)
+        if "directory" in stages:
+            result = measure("directory", srcDir, outputDir, jobs = jobs,
+                    repeat = args.repeat)
+            result.update(case = "all", stage = "directory", jobs = jobs)
+            results.append(result)
+            print(formatResult(result), file = sys.stderr)
+    finally:
+        if not args.keep:
+            shutil.rmtree(srcDir, ignore_errors = True)
+            if args.workdir is None:
+                shutil.rmtree(workdir, ignore_errors = True)
+
+    report = { "environment": environment(), "repeat": args.repeat, "results": results }
+    if args.output is None:
+        json.dump(report, sys.stdout, indent = 1)
+        print()
+    else:
+        with open(args.output, "w") as fileObj:
+            json.dump(report, fileObj, indent = 1)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+"""
+Reusable page-aligned buffers for reading and converting frames
+
+    buf = POOL.acquire((frames, ydim, xdim), '<u2')
+    speHandler.readInto(buf, index)   # readinto, no intermediate bytes
+    ...                               # e.g. fitsWriter.toStorageInPlace(buf)
+    POOL.release(buf)
+
+Buffers are kept per (shape, dtype) and handed out again instead of being
+allocated for every block, so long batches do not churn the allocator and
+their peak RSS stays at the buffers in flight. All buffers of a process
+(free or in use) stay within its byte budget: free buffers of other shapes
+are dropped to make room, otherwise acquire waits for a release. The budget
+(environment variable SPE2FITS_POOL_BYTES, default DEFAULT_BUDGET) is shared
+by worker processes, see `setBudget`.
+Hits, misses, drops and waits are counted in `debug` as pool-hit...
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import debug
+
+DEFAULT_BUDGET = 256 * 1024 * 1024
+ALIGNMENT = 4096 # bytes, a memory page
+
+def alignedEmpty(shape, dtype, alignment = ALIGNMENT):
+    """ uninitialized array whose data starts on an alignment boundary
+    """
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape, dtype = np.int64)) * dtype.itemsize
+    raw = np.empty(nbytes + alignment, dtype = np.uint8)
+    start = -raw.ctypes.data % alignment
+    return raw[start:start + nbytes].view(dtype).reshape(shape)
+
+class BufferPool:
+    """ free arrays per (shape, dtype) within a byte budget, thread-safe
+    """
+    def __init__(self, budget = DEFAULT_BUDGET):
+        self._cond = threading.Condition()
+        self._free = OrderedDict() # {(shape, dtype): [array]}, least recently used first
+        self._budget = budget
+        self._allocated = 0 # bytes of all buffers, free or in use
+        self._inUse = 0
+        self._peak = 0
+        self._counts = dict.fromkeys(("hit", "miss", "drop", "wait"), 0)
+
+    @property
+    def budget(self):
+        return self._budget
+
+    @budget.setter
+    def budget(self, budget):
+        with self._cond:
+            self._budget = max(0, int(budget))
+            self._shrink(0)
+            self._cond.notify_all()
+
+    def _count(self, name):
+        self._counts[name] += 1
+        debug.count("pool-" + name)
+
+    def _shrink(self, nbytes):
+        """ drop free buffers, least recently used first, until nbytes more
+        fit into the budget
+        """
+        while self._free and self._allocated + nbytes > self._budget:
+            key, buffers = next(iter(self._free.items()))
+            self._allocated -= buffers.pop().nbytes
+            if not buffers:
+                del self._free[key]
+            self._count("drop")
+
+    def acquire(self, shape, dtype, stop = None):
+        """ array of shape and dtype, uninitialized, until `release`
+        A buffer larger than the whole budget is still given out when no
+        other is in use. Wait while the budget is used up by buffers in use.
+        stop: threading.Event, return None once it is set while waiting
+        """
+        shape = tuple(int(n) for n in shape)
+        dtype = np.dtype(dtype)
+        key = (shape, dtype.str)
+        nbytes = int(np.prod(shape, dtype = np.int64)) * dtype.itemsize
+        with self._cond:
+            waited = False
+            while True:
+                buffers = self._free.get(key)
+                if buffers:
+                    buf = buffers.pop()
+                    if not buffers:
+                        del self._free[key]
+                    self._count("hit")
+                    break
+                self._shrink(nbytes)
+                if self._allocated + nbytes <= self._budget or self._inUse == 0:
+                    buf = alignedEmpty(shape, dtype)
+                    self._allocated += nbytes
+                    self._peak = max(self._peak, self._allocated)
+                    self._count("miss")
+                    break
+                if stop is not None and stop.is_set():
+                    return None
+                if not waited:
+                    self._count("wait")
+                    waited = True
+                self._cond.wait(0.1)
+            self._inUse += nbytes
+            return buf
+
+    def release(self, buf):
+        """ give back a buffer of `acquire` (not a view of it)
+        """
+        key = (buf.shape, buf.dtype.str)
+        with self._cond:
+            self._inUse -= buf.nbytes
+            self._free.setdefault(key, []).append(buf)
+            self._free.move_to_end(key)
+            self._shrink(0)
+            self._cond.notify_all()
+
+    def clear(self):
+        """ drop all free buffers
+        """
+        with self._cond:
+            for buffers in self._free.values():
+                self._allocated -= sum(buf.nbytes for buf in buffers)
+            self._free.clear()
+
+    def stats(self):
+        """ {"hit", "miss", "drop", "wait", "allocated", "in_use", "peak",
+        "budget"}, counts and bytes of this process
+        """
+        with self._cond:
+            return dict(self._counts, allocated = self._allocated,
+                    in_use = self._inUse, peak = self._peak, budget = self._budget)
+
+def _defaultBudget():
+    try:
+        return int(os.environ.get("SPE2FITS_POOL_BYTES", DEFAULT_BUDGET))
+    except ValueError:
+        return DEFAULT_BUDGET
+
+POOL = BufferPool(_defaultBudget()) # shared by everything in this process
+
+def setBudget(budget):
+    """ set budget of `POOL`, e.g. as initializer of worker processes
+    given their share of the parent's budget ( POOL.budget // workers )
+    """
+    POOL.budget = budget
@@ -1,14 +1,181 @@
 #!/usr/bin/env python3
 
+"""
+Debugging and timing instrumentation
+
+debug_method_info: print calls of decorated methods, only if environment
+    variable SPE2FITS_DEBUG is set to a level >= 1 when this module is
+    imported, otherwise methods are left undecorated (no overhead).
+span / count: named timers and counters, e.g.
+        with span("fits-write", nbytes = arr.nbytes):
+            ...
+    aggregated process-wide in `STATS` and in every `collecting()` block of
+    the current thread, e.g. per file. Wall and CPU time are both kept:
+    wall much larger than CPU means waiting on disk (or locks).
+profiling: opt-in cProfile of a block, dumped into SPE2FITS_PROFILE dir.
+"""
+
+import os
+import time
+import itertools
+import threading
 from functools import wraps
+from contextlib import contextmanager
+
+try:
+    DEBUG_LEVEL = int(os.environ.get("SPE2FITS_DEBUG", "0"))
+except ValueError:
+    DEBUG_LEVEL = 1
 
 # TODO Need test on generator
-def debug_method_info(level = -1):
-    # level is useless yet
+def debug_method_info(level = 1):
+    """ print func, args and kwargs on every call if DEBUG_LEVEL >= level
+    """
     def decorator(func):
+        if DEBUG_LEVEL < level:
+            return func
         @wraps(func)
         def method(*args, **kwargs):
             print(func, args, kwargs)
             return func(*args, **kwargs)
         return method
     return decorator
+
+class Stats:
+    """ {name: [count, wall seconds, cpu seconds, bytes]}, thread-safe
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, name, wall = 0.0, cpu = 0.0, nbytes = 0, count = 1):
+        with self._lock:
+            item = self._items.get(name)
+            if item is None:
+                self._items[name] = [count, wall, cpu, nbytes]
+            else:
+                item[0] += count
+                item[1] += wall
+                item[2] += cpu
+                item[3] += nbytes
+
+    def merge(self, snapshot):
+        """ add a `snapshot`, e.g. returned from a worker process
+        """
+        for name, (count, wall, cpu, nbytes) in snapshot.items():
+            self.add(name, wall, cpu, nbytes, count)
+
+    def snapshot(self):
+        """ copy of the counters, picklable
+        """
+        with self._lock:
+            return { name: list(item) for name, item in self._items.items() }
+
+    def reset(self):
+        """ return `snapshot` and clear the counters
+        """
+        with self._lock:
+            items, self._items = self._items, {}
+        return items
+
+    def summary(self, title = "timing"):
+        return formatStats(self.snapshot(), title)
+
+def formatStats(snapshot, title = "timing"):
+    """ one line per counter: count, wall and cpu seconds, cpu share, MB/s
+    """
+    lines = [ "{:<16} {:>8} {:>10} {:>10} {:>6} {:>10}".format(
+        title, "count", "wall s", "cpu s", "cpu%", "MB/s") ]
+    for name, (count, wall, cpu, nbytes) in sorted(snapshot.items()):
+        lines.append("{:<16} {:>8} {:>10.3f} {:>10.3f} {:>6.0f} {:>10}".format(
+            name, count, wall, cpu, 100 * cpu / wall if wall > 0 else 0,
+            "{:.1f}".format(nbytes / wall / 1e6) if nbytes and wall > 0 else "-"))
+    return "\n".join(lines)
+
+STATS = Stats() # everything recorded in this process
+_profile_ids = itertools.count()
+
+_local = threading.local()
+
+def _collectors():
+    return getattr(_local, "collectors", ())
+
+def record(name, wall = 0.0, cpu = 0.0, nbytes = 0, count = 1):
+    STATS.add(name, wall, cpu, nbytes, count)
+    for stats in _collectors():
+        stats.add(name, wall, cpu, nbytes, count)
+
+def count(name, n = 1):
+    """ increase counter name by n
+    """
+    record(name, count = n)
+
+def merge(snapshot):
+    """ record a snapshot taken in another process
+    """
+    STATS.merge(snapshot)
+    for stats in _collectors():
+        stats.merge(snapshot)
+
+@contextmanager
+def span(name, nbytes = 0):
+    """ time the block as name, nbytes processed by it
+    """
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - wall, time.thread_time() - cpu, nbytes)
+
+@contextmanager
+def collecting():
+    """ yield a Stats recording spans of this thread within the block
+    (besides `STATS` and enclosing `collecting` blocks)
+    """
+    stats = Stats()
+    previous = _collectors()
+    _local.collectors = previous + (stats,)
+    try:
+        yield stats
+    finally:
+        _local.collectors = previous
+
+def bindCollectors(func):
+    """ func recording into the `collecting` blocks of the calling thread,
+    wherever it is run, e.g. as target of another thread
+    """
+    collectors = _collectors()
+    @wraps(func)
+    def bound(*args, **kwargs):
+        previous = _collectors()
+        _local.collectors = collectors
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.collectors = previous
+    return bound
+
+@contextmanager
+def profiling(name, directory = None):
+    """ cProfile the block into <directory>/<name>-<pid>-<n>.prof if directory
+    (default environment variable SPE2FITS_PROFILE) is set, else do nothing
+    Inspect with `python3 -m pstats <file>`.
+    """
+    directory = directory or os.environ.get("SPE2FITS_PROFILE")
+    if not directory:
+        yield
+        return
+    import cProfile
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        os.makedirs(directory, exist_ok = True)
+        safeName = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+        profile.dump_stats(os.path.join(directory,
+            "{}-{}-{}.prof".format(safeName, os.getpid(), next(_profile_ids))))
@@ -1,55 +1,26 @@
 #!/usr/bin/env python3
 
 from os import cpu_count
-from queue import Queue, Empty
-from threading import Thread, Event
-from uuid import uuid4 as gen_uid
+from threading import Lock, Semaphore, Thread
+from concurrent.futures import ThreadPoolExecutor, Future
 from warnings import warn
 from enum import Enum, unique
-from functools import partial
 
 from debug import debug_method_info
 
-@unique
-class EventType(Enum):
-    """
-    # parent event:   distribute child event
-    # child event:    process one
-    # feedback event: return child event result
-    # final event:    complete parent work
-    """
-    parent = 1
-    child = 2
-    feedback = 3
-    final = 4
-
-class EventWrapper:
-    def __init__(self, master, etype, eid, handler, *args, **kwargs):
-        """
-        master: EventQueue
-        etype: EventType
-        eid: Unique id for group of events
-        handler: event handler to be invoked
-        """
-        self._type = etype
-        self._id = eid
-        self._master = master
-        try:
-            self._handler = partial(handler, *args, **kwargs)
-        except TypeError:
-            self._handler = None
-
-    def dispatch(self):
-        if self._handler is not None:
-            return self._handler()
+_shared_executor = None
+_shared_executor_lock = Lock()
 
-    @property
-    def getType(self):
-        return self._type
-
-    @property
-    def getId(self):
-        return self._id
+def sharedExecutor():
+    """ thread pool shared by all EventQueue, created on first use
+    """
+    global _shared_executor
+    with _shared_executor_lock:
+        if _shared_executor is None:
+            workers = 1 if cpu_count() <= 1 else cpu_count() - 1
+            _shared_executor = ThreadPoolExecutor(max_workers = workers,
+                    thread_name_prefix = "EventQueue")
+        return _shared_executor
 
 @unique
 class QueueStatus(Enum):
@@ -62,50 +33,26 @@ class EventQueue:
     """ Hold queue of events
     call setChildren to set children iter
     call startEvents to start
-    method can be overrided: createQueue, on_started, on_child_process,
+    method can be overrided: on_started, on_child_process,
         on_child_done, on_finished
+
+    Children are submitted to an executor (shared by all queues by default),
+    on_child_process runs concurrently, on_child_done and on_finished are
+    serialized per queue. `future` is resolved when all children are done.
+    At most maxInFlight children are pulled from the children iterator and
+    not done yet, the next one is pulled only when one of them is done.
     """
     @debug_method_info()
-    def __init__(self, children = ()):
+    def __init__(self, children = (), executor = None, maxInFlight = None):
+        self._executor = executor if executor is not None else sharedExecutor()
+        if maxInFlight is None:
+            maxInFlight = 2 * (cpu_count() or 1)
+        self._slots = Semaphore(maxInFlight)
+        self._lock = Lock()
+        self._future = Future()
         self._child_event_count = 0
         self._child_event_done_count = 0
-        self.queue_router.update(self.createQueue())
         self.setChildren(children)
-        self._stop_event = Event()
-        self._worker_router = {
-                EventType.parent:   self._worker_parent,
-                EventType.child :   self._worker_child,
-                EventType.feedback: self._worker_feedback,
-                EventType.final :   self._worker_final,
-                }
-
-    @debug_method_info()
-    def __del__(self):
-        self._stop_event.set()
-        for queue in self._queue_router.values():
-            self.remove_queue(queue)
-
-    def remove_queue(self, Q):
-        # ref: http://stackoverflow.com/questions/6517953/clear-all-items-from-the-queue
-        with Q.mutex:
-            for ele in filter(lambda x: x.getId == self.task_id, Q.queue):
-                Q.queue.remove(ele)
-                Q.task_done()
-
-    def createQueue(self):
-        """ create alternative Queue, to be overrided
-        """
-        return {}
-
-    def _wrap_event(self, etype, handler, *args, **kwargs):
-        return EventWrapper(self, etype, self.task_id, handler, *args, **kwargs)
-
-    @property
-    def queue_router(self):
-        if not hasattr(self, "_queue_router"):
-            self._queue_router = { et: Queue() for et in EventType }
-            print("queue count:", len(self._queue_router))
-        return self._queue_router
 
     @property
     def state(self):
@@ -114,117 +61,45 @@ class EventQueue:
         return self._state
 
     @property
-    def task_id(self):
-        if not hasattr(self, "_task_id"):
-            self._task_id = gen_uid()
-        return self._task_id
-
-    @property
-    def queue_parent(self):
-        return self._queue_router[EventType.parent]
+    def future(self):
+        """ resolved with number of children when all events are done
+        """
+        return self._future
 
     @property
-    def queue_child(self):
-        return self._queue_router[EventType.child]
+    def childCount(self):
+        """ number of children pulled from iterator so far
+        """
+        return self._child_event_count
 
     @property
-    def queue_feedback(self):
-        return self._queue_router[EventType.feedback]
+    def childDoneCount(self):
+        return self._child_event_done_count
 
     @property
-    def queue_final(self):
-        return self._queue_router[EventType.final]
-
-    @debug_method_info()
-    def _worker(self, queue):
-        while not self._stop_event.is_set():
-            try:
-                event = queue.get(timeout=1)
-            except Empty:
-                continue
-            if event.getId == self.task_id:
-                self._dispatch(event)
-                queue.task_done()
-            else:
-                queue.put(event)
-        print("quit worker")
-
-    @debug_method_info()
-    def _worker_parent(self, event):
-        event.dispatch()
-
-    @debug_method_info()
-    def _put_child(self, chid):
-        self._child_event_count += 1
-        chandler = self.on_child_process
-        cevent = self._wrap_event(EventType.child, chandler, chid)
-        self._queue_router[EventType.child].put(cevent)
-
-    @debug_method_info()
-    def _worker_child(self, event):
-        result = event.dispatch()
-        self._put_feedback(result)
-
-    @debug_method_info()
-    def _put_feedback(self, result):
-        fevent = self._wrap_event(EventType.feedback, self._feedback_process, result)
-        self.queue_feedback.put(fevent)
-
-    @debug_method_info()
-    def _feedback_process(self, result):
-        """ check child process
+    def allDistributed(self):
+        """ True when children iterator is exhausted, childCount is the total
         """
-        self._child_event_done_count += 1
-        if self.state == QueueStatus.waiting and \
-                self._child_event_done_count == self._child_event_count:
-                    self._state = QueueStatus.final
-                    print("all children finished")
-        self.on_child_done(result)
-        if self.state == QueueStatus.final:
-            self._put_final()
-
-    @debug_method_info()
-    def _put_final(self):
-        fievent = self._wrap_event(EventType.final, self._final_process)
-        self.queue_final.put(fievent)
+        return self.state in (QueueStatus.waiting, QueueStatus.final)
 
-    @debug_method_info()
-    def _worker_feedback(self, event):
-        print("_worker_feedback", event)
-        event.dispatch()
-
-    @debug_method_info()
-    def _worker_final(self, event):
-        print("_worker_final", event)
-        event.dispatch()
-
-    @debug_method_info()
-    def _dispatch(self, event):
-        self._worker_router[event.getType](event)
+    def wait(self, timeout = None):
+        """ block until all events are done
+        """
+        return self._future.result(timeout)
 
     @debug_method_info()
     def startEvents(self):
         """ Process events
         """
-        if self.state != QueueStatus.un_init:
-            raise RuntimeError("At present the queue can only be started once!")
-
-        self._thread_parent = Thread(target = self._worker, args = ( self.queue_parent,))
+        with self._lock:
+            if self.state != QueueStatus.un_init:
+                raise RuntimeError("At present the queue can only be started once!")
+            self._state = QueueStatus.init
+        self._future.set_running_or_notify_cancel()
+        # parent blocks on free slots, keep it off the shared executor
+        self._thread_parent = Thread(target = self._parent_process,
+                name = "EventQueue-parent", daemon = True)
         self._thread_parent.start()
-
-        self._child_worker_count = 1 if cpu_count() <= 1 else cpu_count() - 1
-        self._thread_children = [
-                Thread(target = self._worker, args = ( self.queue_child,)) \
-                        for i in range(self._child_worker_count) ]
-        [ x.start() for x in self._thread_children ]
-
-        self._thread_feedback = Thread(target = self._worker, args = ( self.queue_feedback,))
-        self._thread_feedback.start()
-
-        self._thread_final = Thread(target = self._worker, args = ( self.queue_final,))
-        self._thread_final.start()
-
-        self._put_parent()
         self.on_started()
 
     @debug_method_info()
@@ -233,40 +108,72 @@ class EventQueue:
         """
         pass
 
-    @debug_method_info()
-    def _put_parent(self):
-        """ Starting queue, put parent event
-        """
-        pevent = self._wrap_event(EventType.parent, self._parent_process)
-        self.queue_parent.put(pevent)
-
-    @debug_method_info()
     def _parent_process(self):
         """ Distributing child event
         """
-        self._state = QueueStatus.init
-        for child in self._children:
-            self._put_child(child)
-        self._state = QueueStatus.waiting
+        try:
+            while True:
+                self._slots.acquire()
+                try:
+                    child = next(self._children)
+                except StopIteration:
+                    self._slots.release()
+                    break
+                with self._lock:
+                    self._child_event_count += 1
+                try:
+                    cfuture = self._executor.submit(self.on_child_process, child)
+                except Exception:
+                    # e.g. executor shut down, never counted as done otherwise
+                    with self._lock:
+                        self._child_event_count -= 1
+                    self._slots.release()
+                    raise
+                cfuture.add_done_callback(self._feedback_process)
+        except Exception as e:
+            warn("distributing children failed: {}".format(e))
+        with self._lock:
+            self._state = QueueStatus.waiting
+            finished = self._check_final()
+        if finished:
+            self._final_process()
+
+    def _feedback_process(self, cfuture):
+        """ check child process
+        """
+        try:
+            result = cfuture.result()
+        except Exception as e:
+            warn("child event failed: {}".format(e))
+            result = None
+        self._slots.release()
+        with self._lock:
+            self._child_event_done_count += 1
+            try:
+                self.on_child_done(result)
+            finally:
+                finished = self._check_final()
+        if finished:
+            self._final_process()
+
+    def _check_final(self):
+        """ called with lock held, True only once when all children are done
+        """
+        if self._state == QueueStatus.waiting and \
+                self._child_event_done_count == self._child_event_count:
+            self._state = QueueStatus.final
+            return True
+        return False
 
     def setChildren(self, childIter):
         if childIter is None:
-            self._children = ()
+            self._children = iter(())
             return
         try:
             self._children = iter(childIter)
         except TypeError:
             self._children = iter(childIter,)
 
-  #  def _get_child(self):
-  #      """ Distribute child events ...
-  #      """
-  #      try:
-  #          child = next(self._children)
-  #          yield self._put_child(child)
-  #      except StopIteration:
-  #          return
-
     @debug_method_info()
     def on_child_process(self, child):
         """ Child event that can be executed concurrently
@@ -279,10 +186,12 @@ class EventQueue:
         """
         pass
 
-    @debug_method_info()
     def _final_process(self):
-        self.on_finished()
-        self._stop_event.set()
+        try:
+            with self._lock:
+                self.on_finished()
+        finally:
+            self._future.set_result(self._child_event_count)
 
     @debug_method_info()
     def on_finished(self):
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import sys
+import os
 import re
 
 # Try to match: "^# (type)  (key)  (offset) (description)$"
@@ -22,6 +23,25 @@ def saveHeader2csv(meta):
             meta)
         )
 
+def saveHeader2py(meta, output, source = "WINHEAD.TXT"):
+    """ write header defination as python module, which can be imported
+    instead of parsing the text file at startup
+    """
+    with open(output, "w") as fhandler:
+        fhandler.write("# Generated by extractHeaderDesc.py from {source}, do not edit\n"
+                .format(source = os.path.basename(source)))
+        fhandler.write("# Regenerate: python3 extractHeaderDesc.py {source} {output}\n\n"
+                .format(source = os.path.basename(source),
+                    output = os.path.basename(output)))
+        fhandler.write("SOURCE = {source!r}\n\n".format(
+            source = os.path.basename(source)))
+        fhandler.write("# keys: 'offset', 'type', 'key', 'comment'\n")
+        fhandler.write("HEADERS = [\n")
+        for m in meta:
+            fhandler.write("    {{'offset': {offset}, 'type': {type!r}, "
+                    "'key': {key!r}, 'comment': {comment!r}}},\n".format(**m))
+        fhandler.write("]\n")
+
 def getHeaders(filename) -> list:
     fhandler = open(filename)
     fdata = fhandler.readlines()
@@ -39,8 +59,12 @@ def getHeaders(filename) -> list:
     return metadata
 
 if __name__ == '__main__':
+    # extractHeaderDesc.py [WINHEAD.TXT] [winhead.py]
     filename = 'WINHEAD.TXT' if len(sys.argv) < 2 else sys.argv[1]
     metadata = getHeaders(filename)
-    saveHeader2csv(metadata)
+    if len(sys.argv) < 3:
+        saveHeader2csv(metadata)
+    else:
+        saveHeader2py(metadata, sys.argv[2], source = filename)
 #print("\n".join(map(str,metadata)))
 
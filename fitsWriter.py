@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+
+"""
+Write FITS incrementally
+
+Header is written first, then data is appended frame by frame and
+converted to FITS (big-endian) order in fixed-size chunks, so at most
+one chunk besides the frame itself is held in memory.
+
+ref: https://fits.gsfc.nasa.gov/fits_standard.html
+"""
+
+import io
+import os
+
+import numpy as np
+
+import debug
+try:
+    from astropy.io import fits
+except:
+    print("Warning: module astropy not found, import pyfits instead")
+    import pyfits as fits
+
+BLOCK_SIZE = 2880 # FITS logical record
+CHUNK_SIZE = 4 * 1024 * 1024 # bytes converted at a time
+
+def storageDtype(dtype):
+    """ numpy dtype stored in FITS for data of dtype, and its BZERO
+    unsigned 16/32 bits integers are stored signed with offset BZERO
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'u' and dtype.itemsize > 1:
+        return np.dtype('>i{}'.format(dtype.itemsize)), 1 << (dtype.itemsize * 8 - 1)
+    return dtype.newbyteorder('>'), 0
+
+def toStorageInPlace(arr):
+    """ convert native (little-endian) arr to FITS storage order in place,
+    return it viewed as storage dtype, see `storageDtype`
+    arr must be writable and not shared, e.g. a buffer just read into
+    """
+    storage, bzero = storageDtype(arr.dtype)
+    if bzero:
+        signed = arr.view(arr.dtype.str.replace('u', 'i'))
+        np.bitwise_xor(signed, signed.dtype.type(-bzero), out = signed)
+    if arr.dtype.itemsize > 1 and arr.dtype.byteorder != '>':
+        arr.byteswap(inplace = True)
+    return arr.view(storage)
+
+# names accepted by `Compression`
+COMPRESSION_TYPES = {
+        "rice": "RICE_1",
+        "gzip": "GZIP_1",
+        "gzip2": "GZIP_2", # byte shuffled, better for floats
+        "hcompress": "HCOMPRESS_1",
+        }
+# PLIO_1 is left out: it only takes non-negative mask-like integers, and
+# noisy int16/int32 frames corrupt astropy's heap (the process aborts)
+
+class Compression:
+    """ tile compression settings of image HDUs, resolved per datatype:
+    integer images are lossless unless hcompScale > 0 with HCOMPRESS,
+    float images are quantized to quantize levels of their noise, or kept
+    lossless with quantize = 0, which only GZIP supports (GZIP_2 is used)
+    """
+    def __init__(self, type_ = "rice", quantize = 16.0, hcompScale = 0, tileShape = None):
+        """
+        type_: key or value of COMPRESSION_TYPES
+        tileShape: numpy order, default is one row (astropy's default)
+        """
+        self.type_ = COMPRESSION_TYPES.get(type_, type_)
+        if self.type_ not in COMPRESSION_TYPES.values():
+            raise ValueError("unknown compression: {}".format(type_))
+        self.quantize = quantize
+        self.hcompScale = hcompScale
+        self.tileShape = tileShape
+
+    def __repr__(self):
+        return "Compression({!r}, quantize = {}, hcompScale = {}, tileShape = {})".format(
+                self.type_, self.quantize, self.hcompScale, self.tileShape)
+
+    def hduArgs(self, dtype):
+        """ keyword arguments of astropy CompImageHDU for images of dtype
+        """
+        dtype = np.dtype(dtype)
+        args = { "compression_type": self.type_ }
+        if self.tileShape is not None:
+            args["tile_shape"] = tuple(self.tileShape)
+        if dtype.kind == 'f':
+            args["quantize_level"] = self.quantize
+            if self.quantize == 0 and not self.type_.startswith("GZIP"):
+                args["compression_type"] = "GZIP_2" # only lossless float codec
+        elif self.type_ == "HCOMPRESS_1":
+            args["hcomp_scale"] = self.hcompScale
+        return args
+
+def compressedHDU(data, header, compression):
+    """ astropy CompImageHDU of data, header cards are copied
+    """
+    return fits.CompImageHDU(data = data, header = header,
+            **compression.hduArgs(data.dtype))
+
+def hduBytes(hdu, output_verify = "exception"):
+    """ serialized extension hdu (e.g. `compressedHDU`), padded to FITS blocks
+    to be written after the primary HDU by `FitsStreamWriter.writeRaw`
+    """
+    buf = io.BytesIO()
+    fits.HDUList([fits.PrimaryHDU(), hdu]).writeto(buf, output_verify = output_verify)
+    buf.seek(0)
+    header, raw = readHeader(buf) # skip empty primary HDU
+    return buf.getvalue()[len(raw):]
+
+def imageHeader(header, shape, dtype, primary = True, output_verify = "exception"):
+    """ copy of header with mandatory keywords for image of shape and dtype
+    header: astropy Header (or None)
+    shape: numpy order, e.g. (frames, ydim, xdim)
+    primary: PrimaryHDU header, otherwise IMAGE extension
+    The keywords are produced (and the header verified) by astropy from
+    a dummy HDU, only NAXISn are patched afterwards.
+    """
+    hduClass = fits.PrimaryHDU if primary else fits.ImageHDU
+    with debug.span("astropy-header"):
+        if len(shape) == 0:
+            hdu = hduClass(header = header)
+        else:
+            dummy = np.zeros((1,) * len(shape), dtype = np.dtype(dtype).newbyteorder('='))
+            hdu = hduClass(data = dummy, header = header)
+        hdu.verify(output_verify)
+        header = hdu.header.copy()
+    for axis, size in enumerate(reversed(shape)):
+        header['NAXIS{}'.format(axis + 1)] = size
+    return header
+
+class HeaderTemplate:
+    """ image header serialized (and verified by astropy) once, to be
+    written many times with only the values of some keywords changed
+    Every patched card keeps its 80 characters, the header its size.
+    """
+    def __init__(self, header, shape = None, dtype = None, primary = True,
+            output_verify = "exception"):
+        """
+        header: astropy Header, keywords to patch must be in it (placeholders)
+        shape, dtype, primary, output_verify: see `imageHeader`
+        shape None: header is already complete, e.g. from `imageHeader`
+        """
+        if shape is None:
+            self._header = header.copy()
+        else:
+            self._header = imageHeader(header, shape, dtype, primary = primary,
+                    output_verify = output_verify)
+        self._raw = self._header.tostring().encode('ascii') # padded
+        self._positions = {}
+        for pos in range(0, len(self._raw), 80):
+            key = self._raw[pos:pos + 8].decode('ascii').rstrip()
+            self._positions.setdefault(key, pos)
+
+    @property
+    def header(self):
+        return self._header
+
+    def __len__(self):
+        return len(self._raw)
+
+    def render(self, values = None):
+        """ header bytes with {keyword: value} patched, comments are kept
+        """
+        if not values:
+            return self._raw
+        raw = bytearray(self._raw)
+        for key, val in values.items():
+            pos = self._positions.get(key)
+            if pos is None:
+                raise KeyError("{} is not in header template".format(key))
+            card = fits.Card(key, val, self._header.comments[key]).image
+            if len(card) != 80:
+                raise ValueError("{} = {!r} does not fit in one card".format(key, val))
+            raw[pos:pos + 80] = card.encode('ascii')
+        return bytes(raw)
+
+class FitsStreamWriter:
+    """ Write HDUs to a FITS file piece by piece
+    writeHeader(header), writeData(arr)..., endHDU(), next HDU ...
+    """
+    def __init__(self, name, clobber = True, chunkSize = CHUNK_SIZE,
+            offset = None, dtype = None):
+        """
+        offset: fill space of an existing file (see `reserveData`) from
+            offset on, with data of dtype, instead of creating a new file
+        """
+        self._name = name
+        self._chunkSize = chunkSize
+        self._dataBytes = 0
+        self._bzero = 0
+        self._storage = None
+        self._padding = offset is None
+        if offset is None:
+            self._fileObj = open(name, "wb" if clobber else "xb")
+        else:
+            self._fileObj = open(name, "r+b")
+            self._fileObj.seek(offset)
+            self._storage, self._bzero = storageDtype(dtype)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def name(self):
+        return self._name
+
+    def writeHeader(self, header, dtype):
+        """ start a new HDU
+        header: from `imageHeader`, or its bytes (e.g. `HeaderTemplate.render`)
+        dtype: numpy dtype of data which will be written
+        """
+        self.endHDU()
+        self._storage, self._bzero = storageDtype(dtype)
+        if not isinstance(header, bytes):
+            header = header.tostring().encode('ascii')
+        self._fileObj.write(header)
+
+    def writeData(self, arr):
+        """ append data of current HDU, converted to FITS order chunk by chunk
+        """
+        flat = np.asarray(arr).reshape(-1)
+        with debug.span("fits-write", flat.nbytes):
+            self._writeChunks(flat)
+
+    def _writeChunks(self, flat):
+        step = max(1, self._chunkSize // max(1, flat.itemsize))
+        for start in range(0, flat.size, step):
+            chunk = flat[start:start + step]
+            if self._bzero:
+                # u - bzero as signed is u with sign bit flipped
+                signed = chunk.view(chunk.dtype.str.replace('u', 'i'))
+                chunk = np.bitwise_xor(signed, signed.dtype.type(-self._bzero))
+            chunk = chunk.astype(self._storage, copy = False)
+            self._fileObj.write(chunk.tobytes())
+            self._dataBytes += chunk.nbytes
+
+    def writeConverted(self, arr):
+        """ append data of current HDU, already in storage order and dtype,
+        e.g. from `toStorageInPlace`, written without any copy
+        """
+        if arr.dtype != self._storage:
+            raise ValueError("data is {}, not {}".format(arr.dtype, self._storage))
+        with debug.span("fits-write", arr.nbytes):
+            self._fileObj.write(memoryview(np.ascontiguousarray(arr)).cast('B'))
+        self._dataBytes += arr.nbytes
+
+    def writeRaw(self, data):
+        """ append complete HDUs, e.g. from `hduBytes`
+        """
+        self.endHDU()
+        self._fileObj.write(data)
+
+    def reserveData(self, nbytes):
+        """ preallocate nbytes (padded to FITS block) after current position
+        to be filled by writers opened with `offset`
+        """
+        size = -(-nbytes // BLOCK_SIZE) * BLOCK_SIZE
+        self._fileObj.truncate(self._fileObj.tell() + size)
+        self._dataBytes = 0
+
+    def tell(self):
+        return self._fileObj.tell()
+
+    def patch(self, offset, data):
+        """ overwrite bytes at offset keeping the current position, e.g. a
+        header rendered again by `HeaderTemplate` once values known only
+        after its data (statistics) are written
+        """
+        pos = self._fileObj.tell()
+        self._fileObj.seek(offset)
+        self._fileObj.write(data)
+        self._fileObj.seek(pos)
+
+    def endHDU(self):
+        """ pad data of current HDU to FITS block
+        """
+        rest = self._dataBytes % BLOCK_SIZE
+        if rest:
+            self._fileObj.write(b'\x00' * (BLOCK_SIZE - rest))
+        self._dataBytes = 0
+
+    def close(self):
+        if self._fileObj.closed:
+            return
+        try:
+            if self._padding:
+                self.endHDU()
+        finally:
+            self._fileObj.close()
+
+def readHeader(fileObj):
+    """ read header of HDU at current position of fileObj
+    return (astropy Header, raw header bytes), raw length is header's size
+    """
+    blocks = []
+    while True:
+        block = fileObj.read(BLOCK_SIZE)
+        if len(block) < BLOCK_SIZE:
+            raise ValueError("incomplete FITS header")
+        blocks.append(block)
+        if any(block[pos:pos + 8] == b'END     '
+                for pos in range(0, BLOCK_SIZE, 80)):
+            break
+    raw = b''.join(blocks)
+    return fits.Header.fromstring(raw.decode('ascii')), raw
+
+def dataBytes(name):
+    """ bytes of data (without headers and padding) of all HDUs of name,
+    e.g. the compressed tiles and heap of tile-compressed images
+    """
+    total = 0
+    with open(name, "rb") as fileObj:
+        size = os.fstat(fileObj.fileno()).st_size
+        while fileObj.tell() < size:
+            header, raw = readHeader(fileObj)
+            nbytes = 0
+            if header.get('NAXIS', 0) > 0:
+                nbytes = abs(header['BITPIX']) // 8
+                for axis in range(header['NAXIS']):
+                    nbytes *= header['NAXIS{}'.format(axis + 1)]
+            nbytes = (nbytes + header.get('PCOUNT', 0)) * header.get('GCOUNT', 1)
+            total += nbytes
+            fileObj.seek(-(-nbytes // BLOCK_SIZE) * BLOCK_SIZE, os.SEEK_CUR)
+    return total
+
+def cubeLength(name):
+    """ NAXIS3 of 3-D cube in PrimaryHDU of name
+    """
+    with open(name, "rb") as fileObj:
+        header, raw = readHeader(fileObj)
+    return header['NAXIS3']
+
+def appendToCube(name, frames, dtype, values = None):
+    """ append frames (iterable of 2-D arrays of dtype) to the 3-D cube in
+    PrimaryHDU of name, e.g. written by `FitsStreamWriter`
+    Data is appended first and NAXIS3 updated last, anything after the
+    cube's declared data (padding, half written frames) is dropped first,
+    so an interrupted append is simply redone by the next one.
+    values: {keyword: value} of other primary cards updated with NAXIS3,
+            e.g. NUMFRAMES, keywords not in the header are ignored
+    return new NAXIS3
+    """
+    with open(name, "r+b") as fileObj:
+        header, raw = readHeader(fileObj)
+        if header['NAXIS'] != 3:
+            raise ValueError("{} is not a 3-D cube".format(name))
+        frameBytes = header['NAXIS1'] * header['NAXIS2'] * abs(header['BITPIX']) // 8
+        count = header['NAXIS3']
+        dataEnd = len(raw) + count * frameBytes
+        fileObj.truncate(dataEnd)
+    appended = 0
+    with FitsStreamWriter(name, offset = dataEnd, dtype = dtype) as writer:
+        for frame in frames:
+            if np.asarray(frame).nbytes != frameBytes:
+                raise ValueError("frame size does not match {}".format(name))
+            writer.writeData(frame)
+            appended += 1
+    count += appended
+    with open(name, "r+b") as fileObj:
+        rest = (count * frameBytes) % BLOCK_SIZE
+        fileObj.seek(0, os.SEEK_END)
+        if rest:
+            fileObj.write(b'\x00' * (BLOCK_SIZE - rest))
+        values = dict(values or {}, NAXIS3 = count)
+        for pos in range(0, len(raw), 80):
+            if not values:
+                break
+            # keywords longer than 8 characters are HIERARCH cards
+            key = fits.Card.fromstring(raw[pos:pos + 80].decode('ascii')).keyword
+            if key in values:
+                card = fits.Card(key, values.pop(key), header.comments[key]).image
+                if len(card) != 80:
+                    raise ValueError("{} does not fit in one card".format(key))
+                fileObj.seek(pos)
+                fileObj.write(card.encode('ascii'))
+    return count
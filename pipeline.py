@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+"""
+Overlap reading, decoding and writing in threads
+
+    for item in pipeline(reader, decode, depth = 2):
+        write(item)
+
+reader is iterated in a reader thread, decode runs in a decoder thread,
+and the consumer (the writer) in the calling thread; stages are joined by
+queues of depth items, so at most about 2 * depth + 3 items are alive.
+File reads, numpy conversions and file writes release the GIL, so the
+disk and the CPU are kept busy at the same time without extra processes.
+"""
+
+import queue
+import threading
+
+import debug
+
+_DONE = object()
+_POLL = 0.1 # seconds, how often blocked stages check for stop
+
+def _put(q, item, stop):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout = _POLL)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout = _POLL)
+        except queue.Empty:
+            pass
+    return _DONE
+
+def pipeline(reader, decode = None, depth = 2, stop = None):
+    """ yield decode(item) for item in reader, in order
+    reader: iterable, iterated in its own thread
+    decode: function run on every item in its own thread, None to pass items
+    stop: threading.Event set when the consumer stops (also on error),
+          for a reader blocking elsewhere, e.g. waiting for a free buffer
+    An exception of reader or decode is raised to the consumer.
+    """
+    stop = stop if stop is not None else threading.Event()
+    raw = queue.Queue(max(1, depth))
+    decoded = queue.Queue(max(1, depth))
+    errors = []
+
+    def readStage():
+        try:
+            for item in reader:
+                if not _put(raw, item, stop):
+                    return
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            _put(raw, _DONE, stop)
+
+    def decodeStage():
+        try:
+            while True:
+                item = _get(raw, stop)
+                if item is _DONE:
+                    break
+                if decode is not None:
+                    item = decode(item)
+                if not _put(decoded, item, stop):
+                    return
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            _put(decoded, _DONE, stop)
+
+    # spans of the stages are recorded into `debug.collecting` of the consumer
+    threads = [ threading.Thread(target = debug.bindCollectors(readStage),
+                name = "pipeline-read", daemon = True),
+            threading.Thread(target = debug.bindCollectors(decodeStage),
+                name = "pipeline-decode", daemon = True) ]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            item = _get(decoded, stop)
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
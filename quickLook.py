@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+"""
+Per-frame statistics and thumbnails of (frames, y, x) blocks
+
+Reductions run over a whole block of frames at once (e.g. a slice of
+`SPE.imgData`), so the data is read once, while it is converted anyway,
+instead of opening every FITS again afterwards.
+"""
+
+import struct
+import zlib
+
+import numpy as np
+
+STATS_DTYPE = np.dtype([
+    ('frame', '<i8'),
+    ('min', '<f8'),
+    ('max', '<f8'),
+    ('mean', '<f8'),
+    ('std', '<f8'),
+    ('median', '<f8'),
+    ('nsat', '<i8'),
+    ])
+
+# (FITS keyword, stats field, comment)
+STATS_KEYWORDS = (
+        ('DATAMIN', 'min', "Minimum pixel value"),
+        ('DATAMAX', 'max', "Maximum pixel value"),
+        ('DATAMEAN', 'mean', "Mean pixel value"),
+        ('DATASTD', 'std', "Standard deviation of pixel values"),
+        ('DATAMED', 'median', "Median pixel value"),
+        ('NSATURAT', 'nsat', "Number of saturated pixels"),
+        )
+
+def saturationLevel(dtype):
+    """ default saturation level of dtype, maximum of integer types,
+    None (no saturation) for floats
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind in 'iu':
+        return np.iinfo(dtype).max
+    return None
+
+def blockStats(block, frames = None, saturation = None, median = True):
+    """ statistics of every frame of block, as array of STATS_DTYPE
+    block: (frames, y, x) array
+    frames: frame numbers recorded in field 'frame', default 0...
+    saturation: pixels >= saturation are counted in 'nsat'
+    median: median is the only reduction needing a copy (partition) of block
+    """
+    block = np.asarray(block)
+    flat = block.reshape(block.shape[0], -1)
+    stats = np.zeros(block.shape[0], dtype = STATS_DTYPE)
+    stats['frame'] = np.arange(block.shape[0]) if frames is None else frames
+    if flat.shape[1] == 0:
+        return stats
+    stats['min'] = flat.min(axis = 1)
+    stats['max'] = flat.max(axis = 1)
+    stats['mean'] = flat.mean(axis = 1, dtype = np.float64)
+    stats['std'] = flat.std(axis = 1, dtype = np.float64)
+    stats['median'] = np.median(flat, axis = 1) if median else np.nan
+    if saturation is not None:
+        stats['nsat'] = np.count_nonzero(flat >= saturation, axis = 1)
+    return stats
+
+def combineStats(stats):
+    """ {field: value} over all frames of stats (of equal sized frames)
+    median can not be combined and is left out
+    """
+    if len(stats) == 0:
+        return {}
+    mean = stats['mean'].mean()
+    return {
+            'min': stats['min'].min(),
+            'max': stats['max'].max(),
+            'mean': mean,
+            'std': np.sqrt(max(0.0, (stats['std'] ** 2 + stats['mean'] ** 2).mean() - mean ** 2)),
+            'nsat': int(stats['nsat'].sum()),
+            }
+
+def statsCards(stats):
+    """ [(keyword, value, comment)] of one stats record (or `combineStats`)
+    """
+    cards = []
+    for key, field, comment in STATS_KEYWORDS:
+        try:
+            val = stats[field]
+        except (KeyError, ValueError):
+            continue
+        val = val.item() if hasattr(val, 'item') else val
+        if isinstance(val, float) and not np.isfinite(val):
+            val = None # undefined value, the card keeps its size
+        cards.append((key, val, comment))
+    return cards
+
+def setStatsHeader(header, stats):
+    """ set STATS_KEYWORDS of header from one stats record (or `combineStats`)
+    """
+    for key, val, comment in statsCards(stats):
+        header[key] = (val, comment)
+    return header
+
+def downsample(block, factor):
+    """ block mean of factor x factor pixels, over the last two axes
+    edges which do not fill a whole block are dropped
+    """
+    block = np.asarray(block)
+    if factor <= 1:
+        return block.astype(np.float32)
+    ydim, xdim = block.shape[-2] // factor, block.shape[-1] // factor
+    block = block[..., :ydim * factor, :xdim * factor]
+    shape = block.shape[:-2] + (ydim, factor, xdim, factor)
+    return block.reshape(shape).mean(axis = (-3, -1), dtype = np.float32)
+
+def toUint8(img, lower = 0.5, upper = 99.5):
+    """ scale img between its lower and upper percentiles to 0-255
+    """
+    img = np.asarray(img, dtype = np.float32)
+    if img.size == 0:
+        return img.astype(np.uint8)
+    lo, hi = np.percentile(img, (lower, upper))
+    if hi <= lo:
+        hi = lo + 1
+    return (np.clip((img - lo) / (hi - lo), 0, 1) * 255 + 0.5).astype(np.uint8)
+
+def writePng(name, img):
+    """ write 2-D uint8 img as 8-bit grayscale PNG, no imaging library needed
+    ref: https://www.w3.org/TR/PNG/
+    """
+    img = np.ascontiguousarray(img, dtype = np.uint8)
+    height, width = img.shape
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + \
+                struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+    # every scanline is prefixed by filter type 0 (None)
+    raw = np.zeros((height, width + 1), dtype = np.uint8)
+    raw[:, 1:] = img
+    with open(name, 'wb') as fileObj:
+        fileObj.write(b'\x89PNG\r\n\x1a\n')
+        fileObj.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)))
+        fileObj.write(chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)))
+        fileObj.write(chunk(b'IEND', b''))
+
+def saveThumbnail(name, thumbnail, fmt = "png"):
+    """ save one downsampled frame as 8-bit PNG or float32 .npy
+    """
+    if fmt == "png":
+        writePng(name, toUint8(thumbnail))
+    elif fmt == "npy":
+        np.save(name, np.asarray(thumbnail, dtype = np.float32))
+    else:
+        raise ValueError("unknown thumbnail format: {}".format(fmt))
@@ -4,7 +4,10 @@ from spe2fits import VERSION, AUTHOR
 
 # Dependencies are automatically detected, but it might need
 # fine tuning.
+# winhead is the pre-generated header layout, WINHEAD.TXT is only
+# needed for custom header files
 buildOptions = dict(packages = [], excludes = [],
+        includes = ["winhead"],
         include_files = "WINHEAD.TXT",
         include_msvcr = True,
         )
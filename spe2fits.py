@@ -16,8 +16,11 @@ import sys
 import os
 import re
 import struct
+import threading
 
 import numpy as np
+
+import debug
 try:
     from astropy.io import fits
 except:
@@ -25,7 +28,7 @@ except:
     import pyfits as fits
 
 # If FITS header changed, Major.Minor version will be changed
-VERSION = "0.3.0"
+VERSION = "0.4.0"
 AUTHOR = "JerryJia <jiajerry@mail.ustc.edu.cn>"
 
 class SPE:
@@ -40,15 +43,48 @@ class SPE:
             'TIMEMAX'    : 7   ,   # Max time store as hhmmss\0
             }
     SPE_DATA_OFFSET = 4100 # That is, header's length
+    SPE_HEADER_FILE = "WINHEAD.TXT"
+    BLOCK_BYTES = 64 * 1024 * 1024 # frames reduced at a time by `iterBlocks`
+    PIPELINE_BLOCK_BYTES = 4 * 1024 * 1024 # frames per buffer of `pipelineBlocks`
+
+    # ROIinfoblk[ROIMAX] (not in WINHEAD.TXT's key list), after NumROI
+    ROI_OFFSET = 1512
+    ROI_DTYPE = np.dtype([
+        ('startx', '<u2'), # left x start value
+        ('endx', '<u2'),   # right x value
+        ('groupx', '<u2'), # amount x is binned/grouped in hw
+        ('starty', '<u2'), # top y start value
+        ('endy', '<u2'),   # bottom y value
+        ('groupy', '<u2'), # amount y is binned/grouped in hw
+        ])
+    # (FITS keyword, ROI_DTYPE field, comment) of ROI image extensions
+    ROI_KEYWORDS = (
+            ('ROISTRTX', 'startx', "ROI left x start value"),
+            ('ROIENDX', 'endx', "ROI right x value"),
+            ('ROIGRPX', 'groupx', "ROI x binning"),
+            ('ROISTRTY', 'starty', "ROI top y start value"),
+            ('ROIENDY', 'endy', "ROI bottom y value"),
+            ('ROIGRPY', 'groupy', "ROI y binning"),
+            )
+
+    # process-wide cache of compiled header definations
+    # {abspath: (mtime, SpeHeaderLayout)}, built-in `winhead` is under None
+    _header_layouts = {}
+    _header_layouts_lock = threading.Lock()
 
-    # for key 'datatype'
+    # for key 'datatype', fixed-width little-endian numpy dtype of pixels
+    # (WinView's long is 4 bytes, whatever the native size is)
     SPE_DATATYPE = {
-            0: 'f', #'float' 4
-            1: 'l', #'long' 4
-            2: 'h', #'short' 2
-            3: 'H', #'unsigned short' 2
+            0: '<f4', # float
+            1: '<i4', # long
+            2: '<i2', # short
+            3: '<u2', # unsigned short
+            5: '<f8', # double (LightField)
+            6: '<u1', # unsigned char (LightField)
+            8: '<u4', # unsigned long (LightField)
             }
-    # struct ctype to numpy dtype
+    # struct format (formerly given by `datatype`) to numpy type, kept for
+    # code still using it, `datatype` is now the header's code
     STRUCT_TO_NUMPY = {
             'f': np.float32,
             'l': np.int32,
@@ -74,6 +110,17 @@ class SPE:
             'WORD': 'H',
             'DWORD': 'L',
             }
+    # struct fmt to fixed-width little-endian numpy dtype, see SPE_DATATYPE
+    FMT_TO_DTYPE = {
+            'c': 'S1',
+            'h': '<i2',
+            'f': '<f4',
+            'l': '<i4',
+            'd': '<f8',
+            'B': '<u1',
+            'H': '<u2',
+            'L': '<u4',
+            }
 
     # headers which are to be ignored
     SPE_IGNORE = {
@@ -88,28 +135,45 @@ class SPE:
             'FlatField',
             }
 
-    # XXX share headerDef between multiple files maybe better ?
-    def __init__(self, filename, headerfile = None):
+    def __init__(self, filename, headerfile = None, mmap = False):
+        """
+        filename: .SPE file name or opened file object
+        headerfile: alternative header defination file
+        mmap: serve frames as zero-copy views of a memory-mapped data region
+        """
         self._filename = filename
+        self._headerfile = headerfile
+        self._mmap = mmap
+        self._img_data = None
+        self._frame_templates = {} # see `frameTemplate`
+        self._followed = 0 # frames handed out by `newFrames`
 
-        if headerfile is not None:
-            self._headerDef = self.loadHeadersDef(headerfile)
-        else:
-            self._headerDef = self.loadHeadersDef()
+        # compiled header defination is shared by all instances
+        self._headerDef = SPE.getHeaderLayout(headerfile)
 
         if not hasattr(filename, "read"):
-            self._fileObj = open(filename, "rb")
+            with debug.span("open"):
+                self._fileObj = open(filename, "rb")
         else:
             self._fileObj = filename
-            self._filename = os.path.realname(filename.name)
+            self._filename = os.path.realpath(filename.name)
 
-        self._fitshdr = self._initFitsHeader()
-        self._spe_header = self.loadSpeHeader(self._fileObj, self._headerDef)
-        self._extractInfo()
+        self._fits_header = None # built on first use, see `_fitshdr`
+        with debug.span("header-decode", SPE.SPE_DATA_OFFSET):
+            self._spe_header, roiBlock = self.loadSpeHeader(self._fileObj,
+                    self._headerDef, rois = True)
+            self._extractInfo(roiBlock)
 
     def __del__(self):
         # XXX not tested yet
-        self._fileObj.close()
+        self.close()
+
+    def close(self):
+        """ release memory map and close .SPE file
+        """
+        self._img_data = None
+        if hasattr(self, '_fileObj'):
+            self._fileObj.close()
 
     @property
     def filename(self):
@@ -123,48 +187,270 @@ class SPE:
     def fitsHeader(self):
         return self._fitshdr
 
+    @property
+    def _fitshdr(self):
+        """ FITS header of all .SPE header keys, built by astropy on first
+        use (writing, `fitsHeader`), frame access only needs `_extractInfo`
+        """
+        if self._fits_header is None:
+            with debug.span("astropy-header"):
+                self._fits_header = self._buildFitsHeader()
+        return self._fits_header
+
     @property
     def imgCount(self):
         " return number of images "
         return self._img_count
 
+    def refresh(self):
+        """ re-read header of a growing .SPE (e.g. kinetics still acquiring)
+        return number of complete frames, that is NumFrames in header
+        but no more than what is written yet
+        """
+        header = self.loadSpeHeader(self._fileObj, self._headerDef)
+        numFrames = header['NumFrames'][0]
+        frameBytes = self._img_size
+        count = numFrames
+        if frameBytes > 0:
+            dataBytes = os.fstat(self._fileObj.fileno()).st_size - SPE.SPE_DATA_OFFSET
+            count = max(0, min(numFrames, dataBytes // frameBytes))
+        if count != self._img_count:
+            self._img_count = count
+            self._img_data = None # map again with new shape
+            self._spe_header['NumFrames'] = header['NumFrames']
+            if self._fits_header is not None:
+                self._fits_header['NUMFRAMES'] = numFrames
+            self._frame_templates = {}
+        return count
+
+    def newFrames(self):
+        """ refresh, return range of complete frames added since last call
+        """
+        count = self.refresh()
+        new = range(self._followed, max(self._followed, count))
+        self._followed = new.stop
+        return new
+
+    def followToFits(self, mode = "frames", outPrefix = None, **kwargs):
+        """ one pass of tail/follow: convert only frames added since last pass
+        mode: "frames", new FITS per new frame
+              "cube", new frames appended to `<outPrefix>.fits`
+        return range of frames converted
+        """
+        if mode == "cube" and self._followed == 0:
+            # resume a cube left by previous run
+            from fitsWriter import cubeLength
+            name = "{}.fits".format(self.outputPrefix(outPrefix))
+            if os.path.exists(name):
+                self._followed = min(cubeLength(name), self.refresh())
+        new = self.newFrames()
+        if len(new) == 0:
+            return new
+        if mode == "frames":
+            self.spe2fits(mode = "frames", frames = new, outPrefix = outPrefix, **kwargs)
+        elif mode == "cube":
+            self.appendToFitsCube(new, outPrefix, **kwargs)
+        else:
+            raise ValueError("unknown follow mode: {}".format(mode))
+        return new
+
+    def appendToFitsCube(self, frames, outPrefix = None, clobber = True,
+            output_verify = "exception"):
+        """ append frames to cube `<outPrefix>.fits`, create it if not exists
+        frames: range, its start must be the frame count of existing cube,
+                a missing cube is written from frame 0 to the end of frames
+        NUMFRAMES of the cube is updated to the one of .SPE header.
+        """
+        from fitsWriter import appendToCube, cubeLength
+        if len(self._rois) > 1:
+            raise ValueError("{}: frames of {} ROIs can not be appended to a cube"
+                    .format(self._filename, len(self._rois)))
+        name = "{}.fits".format(self.outputPrefix(outPrefix))
+        if not os.path.exists(name):
+            # e.g. removed meanwhile, a cube must start at frame 0 to be appended to
+            frames = range(0, frames.stop)
+        if frames.start == 0:
+            return self.writeToFitsCube(frames, outPrefix, clobber = clobber,
+                    output_verify = output_verify)
+        if frames.step != 1 or cubeLength(name) != frames.start:
+            raise ValueError("{} does not end at frame {}".format(name, frames.start))
+        appendToCube(name, (frame for i, frame in self.iterFrames(frames)),
+                self.imgData.dtype, { 'NUMFRAMES': self._spe_header['NumFrames'][0] })
+
     def imgType(self):
+        """ (xdim, ydim, numpy dtype of pixels), e.g. dtype('<u2'), formerly
+        a numpy type such as np.ushort
+        """
         # XXX xdim and ydim may be confused
         return self._xdim, self._ydim, self._ndtype
 
     @property
     def imgSize(self):
-        if not hasattr(self, '_img_size'):
-            self._img_size = self._xdim * self._ydim * struct.calcsize(self._datatype)
+        """ bytes of one frame
+        """
         return self._img_size
 
+    def checkSize(self):
+        """ raise ValueError if the file is too short for the frames its
+        header declares (or `refresh` found written)
+        """
+        needed = SPE.SPE_DATA_OFFSET + self._img_count * self._img_size
+        size = os.fstat(self._fileObj.fileno()).st_size
+        if size < needed:
+            raise ValueError("{}: {} frames of {}x{} {} need {} bytes, file has {}"
+                    .format(self._filename, self._img_count, self._xdim, self._ydim,
+                        self._ndtype.name, needed, size))
+
+    @property
+    def imgData(self):
+        """ read-only memory map of the whole data region
+        shape is (NumFrames, ydim, xdim), frames are zero-copy slices of it
+        """
+        if self._img_data is None:
+            self.checkSize()
+            dtype = self._ndtype
+            shape = (self._img_count, self._ydim, self._xdim)
+            if self._img_count * self._ydim * self._xdim == 0:
+                self._img_data = np.empty(shape, dtype = dtype)
+            else:
+                self._img_data = np.memmap(self._fileObj, dtype = dtype,
+                        mode = 'r', offset = SPE.SPE_DATA_OFFSET, shape = shape)
+        return self._img_data
+
     def loadSpeImg(self, index):
-        """ return a list of images' data
+        """ return {index: image data} of selected frames
+        index: frame selection, see `frameIndex`
+        """
+        index = self.frameIndex(index)
+        return dict(zip(index, self.readFrames(index)))
+
+    def __len__(self):
+        return self._img_count
+
+    def __getitem__(self, key):
+        """ spe[i] is one frame, spe[100:5000:10], spe[[1, 5, 9]] or
+        spe[boolean mask] are stacked (frames, ydim, xdim) arrays, see `readFrames`
+        spe[frames, y, x] selects pixels of the selected frames
         """
-        from collections import Iterable
-        if isinstance(index, Iterable):
-            index = list(index)
+        if isinstance(key, tuple):
+            frames, pixels = key[0], key[1:]
         else:
-            try:
-                index = [int(index)]
-            except: # get all images
-                print("Warning: invalid image index", index, ". Fetch all available images")
-                index = list(range(self._img_count))
-
-        datas = {}
-        fmt = str(self._xdim * self._ydim) + self._datatype
-        for i in index:
-            self._fileObj.seek(SPE.SPE_DATA_OFFSET + i * self._img_size)
-            data = self._fileObj.read(self._img_size)
-            datas[i] = np.array(
-                    struct.unpack(fmt, data),
-                    dtype = self._ndtype
-                    ).reshape(self._ydim, self._xdim)
-        return datas
-
-    def writeToFits(self, dataArrs, outPrefix = None, clobber = True, output_verify = "exception"):
-        """ Save dict of ndarray to fits file
-        dataArrs: {index: dataArr} returned by `loadSpeImg`
+            frames, pixels = key, ()
+        if isinstance(frames, (int, np.integer)):
+            data = self.readFrames([frames])[0]
+        else:
+            data = self.readFrames(frames)
+            pixels = (slice(None),) + pixels
+        return data[pixels] if len(pixels) > 0 else data
+
+    def readFrames(self, frames = None):
+        """ selected frames stacked in one (frames, ydim, xdim) array
+        frames: frame selection, see `frameIndex`, negative indexes count
+                from the end, boolean masks are accepted
+        In mmap mode the array is a view of `imgData` for a range (no copy),
+        other selections only touch the pages of the selected frames.
+        Otherwise adjacent indexes are merged and every run of frames is read
+        by one seek and one readinto, straight into the returned array.
+        """
+        index = self.checkedIndex(frames)
+        if self._mmap:
+            return self.mappedFrames(index)
+        out = np.empty((len(index), self._ydim, self._xdim), dtype = self._ndtype)
+        self.readInto(out, index)
+        return out
+
+    def mappedFrames(self, frames = None):
+        """ selected frames from the memory map `imgData`, whatever the mmap
+        mode, zero-copy views for ranges (e.g. slices), copies otherwise
+        For whole selections handed to code needing one array, e.g. astropy.
+        """
+        index = self.checkedIndex(frames)
+        data = self.imgData
+        if isinstance(index, range):
+            if len(index) == 0:
+                return data[0:0]
+            # stop is -1 for a descending range ending at frame 0
+            return data[index.start:index.stop if index.stop >= 0 else None:index.step]
+        return data[index]
+
+    def readInto(self, out, frames):
+        """ fill out, a (frames, ydim, xdim) array of this file's dtype,
+        with selected frames, see `readFrames`
+        """
+        index = self.checkedIndex(frames)
+        if len(index) == 0 or out.nbytes == 0:
+            return out
+        if self._mmap and isinstance(index, range):
+            np.copyto(out, self.readFrames(index))
+            return out
+        if self._mmap:
+            np.take(self.imgData, index, axis = 0, out = out)
+            return out
+        with debug.span("frame-read", out.nbytes):
+            self._readRuns(out, index)
+        return out
+
+    def checkedIndex(self, frames = None):
+        """ `frameIndex`, as range within the file or array of valid indexes
+        raise IndexError or TypeError for invalid selections
+        """
+        if isinstance(frames, np.ndarray) and frames.dtype == np.bool_:
+            if frames.shape != (self._img_count,):
+                raise IndexError("boolean frame mask must have {} elements"
+                        .format(self._img_count))
+            frames = np.flatnonzero(frames)
+        index = self.frameIndex(frames)
+        if isinstance(index, range) and len(index) > 0 and \
+                not 0 <= min(index[0], index[-1]) <= max(index[0], index[-1]) < self._img_count:
+            index = list(index) # negative or out of range, checked below
+        if not isinstance(index, range):
+            index = np.asarray(index).reshape(-1)
+            if index.dtype.kind not in 'iu' and index.size > 0:
+                raise TypeError("invalid frame selection: {!r}".format(frames))
+            index = index.astype(np.intp)
+            index = np.where(index < 0, index + self._img_count, index)
+            if np.any((index < 0) | (index >= self._img_count)):
+                raise IndexError("frame index out of range 0..{}"
+                        .format(self._img_count - 1))
+        return index
+
+    def _readRuns(self, out, index):
+        """ fill out with frames of index, one seek and readinto per run of
+        adjacent frames
+        """
+        frameBytes = out[0].nbytes
+        buf = memoryview(out.reshape(-1).view(np.uint8))
+        index = np.asarray(index)
+        # runs of consecutive frames: [start, stop) positions in index
+        breaks = np.flatnonzero(np.diff(index) != 1) + 1
+        starts = np.concatenate(([0], breaks))
+        stops = np.concatenate((breaks, [len(index)]))
+        for start, stop in zip(starts, stops):
+            self._fileObj.seek(SPE.SPE_DATA_OFFSET + int(index[start]) * frameBytes)
+            view = buf[start * frameBytes:stop * frameBytes]
+            if self._fileObj.readinto(view) != len(view):
+                raise ValueError("{}: frames {} to {} are not completely written"
+                        .format(self._filename, index[start], index[stop - 1]))
+
+    def frameIndex(self, frames = None):
+        """ normalize frame selection to range (or list) of frame indexes
+        frames: None (all frames), int, slice, range or iterable of int
+        """
+        from collections.abc import Iterable
+        if frames is None:
+            return range(self._img_count)
+        if isinstance(frames, np.ndarray) and frames.ndim == 0:
+            frames = int(frames)
+        if isinstance(frames, slice):
+            return range(*frames.indices(self._img_count))
+        if isinstance(frames, range):
+            return frames
+        if isinstance(frames, Iterable):
+            return list(frames)
+        return range(int(frames), int(frames) + 1)
+
+    def outputPrefix(self, outPrefix = None):
+        """ default output prefix is the .SPE file name without extension
         """
         if outPrefix is None:
             matched = re.match('(.*)\.spe.*$', self._filename, flags = re.IGNORECASE)
@@ -172,22 +458,610 @@ class SPE:
                 outPrefix = matched.groups()[0]
             else:
                 outPrefix = self._filename
+        return outPrefix
 
-        for index, dataArr in dataArrs.items():
+    def writeToFits(self, dataArrs, outPrefix = None, clobber = True,
+            output_verify = "exception", stats = False, compression = None, fast = True):
+        """ Save dict of ndarray to fits file
+        dataArrs: {index: dataArr} returned by `loadSpeImg`
+        stats: True to add DATAMIN, DATAMAX... of every frame to its header,
+               or their `frameStats` records, in the order of dataArrs
+        compression: `fitsWriter.Compression` (or its type name), frame is
+               then a tile-compressed image extension after an empty PrimaryHDU
+        fast: write the header verified and serialized once per file (see
+              `frameTemplate`), only FRAMENO and statistics patched per frame,
+              otherwise (or for frames not from this file) by astropy
+        """
+        from quickLook import blockStats, statsCards
+        outPrefix = self.outputPrefix(outPrefix)
+        if stats is True and len(dataArrs) > 0:
+            stats = blockStats(np.stack(list(dataArrs.values())),
+                    list(dataArrs), self.saturation)
+        for count, (index, dataArr) in enumerate(dataArrs.items()):
             name = "{}_x{:03}.fits".format(outPrefix, index)
+            cards = [ ('FRAMENO', int(index), "SPE frame index") ]
+            if stats is not False:
+                cards += statsCards(stats[count])
+            if fast and compression is None and dataArr.dtype == self._ndtype \
+                    and dataArr.shape == (self._ydim, self._xdim):
+                from fitsWriter import FitsStreamWriter
+                template = self.frameTemplate(stats is not False, output_verify)
+                with FitsStreamWriter(name, clobber = clobber) as writer:
+                    writer.writeHeader(template.render(
+                        { key: val for key, val, comment in cards }), dataArr.dtype)
+                    writer.writeData(dataArr)
+                continue
+            header = self._fitshdr.copy()
+            for key, val, comment in cards:
+                header[key] = (val, comment)
+            if compression is not None:
+                self._writeCompressed(name, dataArr, header, compression,
+                        clobber, output_verify)
+                continue
             hdu = fits.PrimaryHDU(data = dataArr,
-                    header = self._fitshdr,
+                    header = header,
                     )
+            with debug.span("astropy-write", dataArr.nbytes):
+                SPE.writeHdu(hdu, name, clobber = clobber, output_verify = output_verify)
+
+    def frameTemplate(self, stats = False, output_verify = "exception"):
+        """ `fitsWriter.HeaderTemplate` of one frame FITS, cached
+        stats: with (placeholder) statistics keywords
+        """
+        key = (stats, output_verify)
+        template = self._frame_templates.get(key)
+        if template is None:
+            from fitsWriter import HeaderTemplate
+            from quickLook import setStatsHeader, STATS_DTYPE
+            header = self._fitshdr.copy()
+            header['FRAMENO'] = (0, "SPE frame index")
+            if stats:
+                setStatsHeader(header, np.zeros(1, dtype = STATS_DTYPE)[0])
+            template = HeaderTemplate(header, (self._ydim, self._xdim), self._ndtype,
+                    output_verify = output_verify)
+            self._frame_templates[key] = template
+        return template
+
+    @staticmethod
+    def _writeCompressed(name, data, header, compression, clobber, output_verify):
+        """ write data as tile-compressed image extension of a new FITS
+        """
+        from fitsWriter import Compression, compressedHDU, dataBytes
+        if not isinstance(compression, Compression):
+            compression = Compression(compression)
+        with debug.span("compress", data.nbytes):
+            hdus = fits.HDUList([fits.PrimaryHDU(),
+                compressedHDU(np.asarray(data), header, compression)])
+            SPE.writeHdu(hdus, name, clobber = clobber, output_verify = output_verify)
+        debug.record("compressed", nbytes = dataBytes(name))
+
+    def writeToFitsCube(self, frames = None, outPrefix = None, extensions = False,
+            clobber = True, output_verify = "exception", jobs = 1, stats = False,
+            compression = None, depth = 2):
+        """ Save selected frames into one FITS file `<outPrefix>.fits`
+        frames: frame selection, checked (see `checkedIndex`) before anything is written
+        extensions: False, frames are one 3-D cube in PrimaryHDU
+                    True, empty PrimaryHDU followed by one ImageHDU per frame
+        jobs: number of processes filling the preallocated file in parallel
+        stats: add DATAMIN, DATAMAX... of the cube to the primary header,
+               and of every frame to its extension header
+        compression: `fitsWriter.Compression` (or its type name), the cube
+               is one tile-compressed image extension (compressed by astropy
+               in this process), extensions are compressed by jobs processes
+        depth: frames are read, converted and written overlapped in
+               threads (see `pipelineBlocks`), by each of jobs processes,
+               0 to write them one by one from `iterFrames`
+        Header is written first, then frames are streamed, only a few
+        blocks of frames are held in memory at a time. Statistics are taken
+        from the frames while they are written, the primary header written
+        with placeholders is patched afterwards.
+        Every ROI of a multi-ROI file is an extension of its own, see `_writeRois`.
+        """
+        from fitsWriter import FitsStreamWriter, HeaderTemplate, BLOCK_SIZE
+        from quickLook import combineStats, statsCards
+        index = self.checkedIndex(frames)
+        if len(self._rois) > 1:
+            return self._writeRois("extensions" if extensions else "cube", index,
+                    outPrefix, clobber, output_verify, stats, compression)
+        name = "{}.fits".format(self.outputPrefix(outPrefix))
+        header, extHeader = self._cubeHeaders(index, extensions, output_verify, stats)
+        if compression is not None:
+            return self._writeCompressedCube(name, index, header, extensions,
+                    clobber, output_verify, jobs, stats, compression)
+        dtype = self.imgData.dtype
+        template = HeaderTemplate(header)
+        with FitsStreamWriter(name, clobber = clobber) as writer:
+            writer.writeHeader(template.render(), dtype)
+            if jobs <= 1 and depth > 0:
+                frameStats = self._writeCubePipelined(writer, index, extHeader,
+                        depth, stats)
+            elif jobs <= 1:
+                frameStats = self._writeCubeFrames(writer, index, extHeader, stats)
+            else:
+                # every frame takes the same room, so chunks can be written anywhere
+                frameSize = self._ydim * self._xdim * dtype.itemsize
+                if extHeader is not None:
+                    frameSize = len(extHeader.tostring()) + \
+                            -(-frameSize // BLOCK_SIZE) * BLOCK_SIZE
+                writer.reserveData(len(index) * frameSize)
+                dataOffset = writer.tell()
+        if jobs > 1:
+            frameStats = list(self._mapChunks(_writeCubeChunk, index, jobs,
+                lambda start, stop: (name, index, extensions, start, stop,
+                    dataOffset + start * frameSize, output_verify, stats, depth)))
+            frameStats = np.concatenate(frameStats) if stats and frameStats else None
+        if stats and not extensions and len(index) > 0:
+            values = { key: val for key, val, comment
+                    in statsCards(combineStats(frameStats)) }
+            with FitsStreamWriter(name, offset = 0, dtype = dtype) as writer:
+                writer.patch(0, template.render(values))
+
+    def _writeCompressedCube(self, name, index, header, extensions, clobber,
+            output_verify, jobs, stats, compression):
+        """ `writeToFitsCube` with compression, header from `_cubeHeaders`
+        """
+        from fitsWriter import FitsStreamWriter, Compression, dataBytes
+        from quickLook import blockStats, combineStats, setStatsHeader
+        if not isinstance(compression, Compression):
+            compression = Compression(compression)
+        if not extensions:
+            data = self.mappedFrames(index)
+            header = header.copy()
+            if stats and len(index) > 0: # data is compressed in memory anyway
+                setStatsHeader(header, combineStats(blockStats(data,
+                    list(index), self.saturation, median = False)))
+            for key in ('SIMPLE', 'BITPIX', 'NAXIS', 'NAXIS1', 'NAXIS2', 'NAXIS3',
+                    'EXTEND', 'BZERO', 'BSCALE'):
+                header.remove(key, ignore_missing = True)
+            return self._writeCompressed(name, data, header,
+                    compression, clobber, output_verify)
+        with FitsStreamWriter(name, clobber = clobber) as writer:
+            writer.writeHeader(header, self.imgData.dtype)
+            if jobs <= 1:
+                chunks = [ self._compressFrames(index, compression, stats, output_verify) ]
+            else:
+                chunks = self._mapChunks(_compressChunk, index, jobs, lambda start, stop: (
+                    index[start:stop], compression, stats, output_verify))
+            for chunk in chunks:
+                for data in chunk:
+                    writer.writeRaw(data)
+        debug.record("compressed", nbytes = dataBytes(name))
+
+    def _compressFrames(self, index, compression, stats = False,
+            output_verify = "exception"):
+        """ yield serialized tile-compressed image extension of every frame
+        """
+        from fitsWriter import compressedHDU, hduBytes
+        from quickLook import blockStats, setStatsHeader
+        for i, frame in self.iterFrames(index):
+            header = fits.Header([('EXTNAME', 'FRAME'), ('EXTVER', i + 1),
+                ('FRAMENO', i, "SPE frame index")])
+            if stats:
+                setStatsHeader(header, blockStats(frame[np.newaxis], [i],
+                    self.saturation)[0])
+            with debug.span("compress", frame.nbytes):
+                yield hduBytes(compressedHDU(frame, header, compression), output_verify)
+
+    def _cubeHeaders(self, index, extensions, output_verify = "exception", stats = False):
+        """ (primary header, image extension header or None) of cube FITS
+        stats: extension header, or the primary header of a cube (of frames),
+               gets (placeholder) statistics keywords
+        """
+        from fitsWriter import imageHeader
+        header = self._fitshdr.copy()
+        if isinstance(index, range):
+            header['FRAME0'] = (index.start, "First SPE frame in this file")
+            header['FRAMESTP'] = (index.step, "SPE frame step")
+        dtype = self.imgData.dtype
+        if not extensions:
+            header = imageHeader(header, (len(index), self._ydim, self._xdim),
+                    dtype, output_verify = output_verify)
+            if stats and len(index) > 0:
+                from quickLook import combineStats, setStatsHeader, STATS_DTYPE
+                setStatsHeader(header, combineStats(np.zeros(1, dtype = STATS_DTYPE)))
+            return header, None
+        extHeader = imageHeader(fits.Header([('EXTNAME', 'FRAME')]),
+                (self._ydim, self._xdim), dtype,
+                primary = False, output_verify = output_verify)
+        extHeader['EXTVER'] = 1
+        extHeader['FRAMENO'] = (0, "SPE frame index")
+        if stats:
+            from quickLook import setStatsHeader, STATS_DTYPE
+            setStatsHeader(extHeader, np.zeros(1, dtype = STATS_DTYPE)[0])
+        return imageHeader(header, (), dtype, output_verify = output_verify), extHeader
+
+    def _writeCubeFrames(self, writer, index, extHeader = None, stats = False):
+        """ write frames of index to writer, as image extensions if extHeader
+        stats: fill statistics keywords of extHeader (see `_cubeHeaders`)
+        return statistics of the frames written if stats, otherwise None
+        """
+        from quickLook import blockStats, setStatsHeader, STATS_DTYPE
+        dtype = self.imgData.dtype
+        collected = [ np.zeros(0, dtype = STATS_DTYPE) ]
+        for i, frame in self.iterFrames(index):
+            if stats:
+                # median only goes to extension headers
+                collected.append(blockStats(frame[np.newaxis], [i],
+                    self.saturation, median = extHeader is not None))
+            if extHeader is not None:
+                extHeader['EXTVER'] = i + 1
+                extHeader['FRAMENO'] = i
+                if stats:
+                    setStatsHeader(extHeader, collected[-1][0])
+                writer.writeHeader(extHeader, dtype)
+            writer.writeData(frame)
+        return np.concatenate(collected) if stats else None
+
+    def _writeCubePipelined(self, writer, index, extHeader = None, depth = 2,
+            stats = False):
+        """ `_writeCubeFrames` from `pipelineBlocks`, extension headers are
+        rendered from a `fitsWriter.HeaderTemplate` of extHeader
+        """
+        from fitsWriter import HeaderTemplate
+        from quickLook import statsCards, STATS_DTYPE
+        template = HeaderTemplate(extHeader) if extHeader is not None else None
+        collected = [ np.zeros(0, dtype = STATS_DTYPE) ]
+        for part, block, blockStats in self.pipelineBlocks(index, depth, stats,
+                median = template is not None):
+            if blockStats is not None:
+                collected.append(blockStats)
+            if template is None:
+                writer.writeConverted(block)
+                continue
+            for count, (i, frame) in enumerate(zip(part, block)):
+                values = { 'EXTVER': int(i) + 1, 'FRAMENO': int(i) }
+                if blockStats is not None:
+                    values.update((key, val) for key, val, comment
+                            in statsCards(blockStats[count]))
+                writer.writeHeader(template.render(values), self._ndtype)
+                writer.writeConverted(frame)
+        return np.concatenate(collected) if stats else None
+
+    def _writeFramesPipelined(self, index, depth = 2, outPrefix = None,
+            clobber = True, output_verify = "exception", stats = False):
+        """ one FITS per frame like `writeToFits`, frames from `pipelineBlocks`
+        """
+        from fitsWriter import FitsStreamWriter
+        from quickLook import statsCards
+        outPrefix = self.outputPrefix(outPrefix)
+        template = self.frameTemplate(stats, output_verify)
+        for part, block, blockStats in self.pipelineBlocks(index, depth, stats):
+            for count, (i, frame) in enumerate(zip(part, block)):
+                values = { 'FRAMENO': int(i) }
+                if blockStats is not None:
+                    values.update((key, val) for key, val, comment
+                            in statsCards(blockStats[count]))
+                name = "{}_x{:03}.fits".format(outPrefix, i)
+                with FitsStreamWriter(name, clobber = clobber) as writer:
+                    writer.writeHeader(template.render(values), self._ndtype)
+                    writer.writeConverted(frame)
+
+    def _writeRois(self, mode, index, outPrefix = None, clobber = True,
+            output_verify = "exception", stats = False, compression = None):
+        """ write every ROI of a multi-ROI file as its own image extension
+        ROI<n> (or tile-compressed ones), after a primary HDU without data
+        mode: "frames", one FITS per frame, EXTVER 1
+              "cube", one FITS, ROI<n> holds (frames, ny, nx), EXTVER 1
+              "extensions", one FITS, ROI<n> of every frame, EXTVER frame + 1
+        ROIs are zero-copy views of blocks of frames, see `splitRois`.
+        """
+        from fitsWriter import FitsStreamWriter, HeaderTemplate, Compression, \
+                compressedHDU, hduBytes, dataBytes
+        from quickLook import blockStats, combineStats, statsCards, STATS_DTYPE
+        if compression is not None and not isinstance(compression, Compression):
+            compression = Compression(compression)
+        outPrefix = self.outputPrefix(outPrefix)
+        dtype = self._ndtype
+        templates = {}
+
+        def roiCards(r, version, frameno = None, frameStats = None):
+            cards = [ ('EXTNAME', 'ROI{}'.format(r + 1), "SPE region of interest"),
+                    ('EXTVER', int(version), "") ]
+            if frameno is not None:
+                cards.append(('FRAMENO', int(frameno), "SPE frame index"))
+            cards += [ (key, int(self._rois[r][field]), comment)
+                    for key, field, comment in SPE.ROI_KEYWORDS ]
+            if frameStats is not None:
+                cards += statsCards(frameStats)
+            return cards
+
+        def writeRoi(writer, r, data, cards):
+            if compression is not None:
+                header = fits.Header([ (key, val, comment) for key, val, comment in cards ])
+                with debug.span("compress", data.nbytes):
+                    writer.writeRaw(hduBytes(compressedHDU(np.ascontiguousarray(data),
+                        header, compression), output_verify))
+                return
+            template = templates.get((r, data.shape))
+            if template is None:
+                template = HeaderTemplate(fits.Header(cards), data.shape, dtype,
+                        primary = False, output_verify = output_verify)
+                templates[(r, data.shape)] = template
+            writer.writeHeader(template.render(
+                { key: val for key, val, comment in cards }), dtype)
+            writer.writeData(data)
+
+        def roiStats(part, rois, median = True):
+            if not stats:
+                return [ [None] * len(part) for roi in rois ]
+            return [ blockStats(roi, list(part), self.saturation, median) for roi in rois ]
+
+        if mode == "frames":
+            primary = self._fitshdr.copy()
+            primary['FRAMENO'] = (0, "SPE frame index")
+            primary = HeaderTemplate(primary, (), dtype, output_verify = output_verify)
+            for part, block in self.iterBlocks(index):
+                rois = self.splitRois(block)
+                frameStats = roiStats(part, rois)
+                for count, i in enumerate(part):
+                    name = "{}_x{:03}.fits".format(outPrefix, i)
+                    with FitsStreamWriter(name, clobber = clobber) as writer:
+                        writer.writeHeader(primary.render({ 'FRAMENO': int(i) }), dtype)
+                        for r, roi in enumerate(rois):
+                            writeRoi(writer, r, roi[count],
+                                    roiCards(r, 1, i, frameStats[r][count]))
+                    if compression is not None:
+                        debug.record("compressed", nbytes = dataBytes(name))
+            return
+
+        name = "{}.fits".format(outPrefix)
+        header, extHeader = self._cubeHeaders(index, True, output_verify)
+        with FitsStreamWriter(name, clobber = clobber) as writer:
+            writer.writeHeader(header, dtype)
+            if mode == "extensions":
+                for part, block in self.iterBlocks(index):
+                    rois = self.splitRois(block)
+                    frameStats = roiStats(part, rois)
+                    for count, i in enumerate(part):
+                        for r, roi in enumerate(rois):
+                            writeRoi(writer, r, roi[count],
+                                    roiCards(r, i + 1, i, frameStats[r][count]))
+                return
+            stats = stats and len(index) > 0
+            placeholder = combineStats(np.zeros(1, dtype = STATS_DTYPE)) if stats else None
+            # compressed ROIs are whole cubes, views of the mapped frames
+            rois = self.splitRois(self.mappedFrames(index)) if compression is not None else None
+            for r, (ny, nx) in enumerate(self.roiShapes):
+                if compression is not None:
+                    cubeStats = combineStats(blockStats(rois[r], list(index),
+                        self.saturation, median = False)) if stats else None
+                    writeRoi(writer, r, rois[r], roiCards(r, 1, frameStats = cubeStats))
+                    continue
+                # statistics are taken while writing, the header patched afterwards
+                template = HeaderTemplate(fits.Header(roiCards(r, 1,
+                    frameStats = placeholder)), (len(index), ny, nx), dtype,
+                    primary = False, output_verify = output_verify)
+                writer.endHDU()
+                offset = writer.tell()
+                writer.writeHeader(template.render(), dtype)
+                blocks = [ np.zeros(0, dtype = STATS_DTYPE) ]
+                for part, block in self.iterBlocks(index):
+                    roi = self.splitRois(block)[r]
+                    if stats:
+                        blocks.append(blockStats(roi, list(part), self.saturation,
+                            median = False))
+                    writer.writeData(roi)
+                if stats:
+                    writer.patch(offset, template.render({ key: val for key, val, comment
+                        in statsCards(combineStats(np.concatenate(blocks))) }))
+        if compression is not None:
+            debug.record("compressed", nbytes = dataBytes(name))
+
+    def _runChunks(self, worker, index, jobs, chunkArgs):
+        """ split index into contiguous chunks, run
+        worker(filename, headerfile, *chunkArgs(start, stop)) in processes
+        """
+        for result in self._mapChunks(worker, index, jobs, chunkArgs):
+            pass
+
+    def _mapChunks(self, worker, index, jobs, chunkArgs):
+        """ like `_runChunks`, yield results of the chunks in order
+        worker returns (result, timing snapshot), see `debug.collecting`
+        At most 2 * jobs chunks (of at most BLOCK_BYTES) are pending.
+        """
+        from collections import deque
+        from concurrent.futures import ProcessPoolExecutor
+        from bufferPool import POOL, setBudget
+        chunkSize = max(1, min(-(-len(index) // (jobs * 4)),
+            SPE.BLOCK_BYTES // max(1, self._img_size)))
+        # workers share the buffer budget of this process
+        with ProcessPoolExecutor(max_workers = jobs, initializer = setBudget,
+                initargs = (POOL.budget // jobs,)) as executor:
+            pending = deque()
+            for start in range(0, len(index), chunkSize):
+                pending.append(executor.submit(worker, self._filename, self._headerfile,
+                    *chunkArgs(start, min(start + chunkSize, len(index)))))
+                while len(pending) >= 2 * jobs or \
+                        (start + chunkSize >= len(index) and pending):
+                    result, timing = pending.popleft().result()
+                    debug.merge(timing) # of the worker
+                    yield result
+
+    @property
+    def saturation(self):
+        """ pixel value counted as saturated, maximum of integer datatype
+        """
+        from quickLook import saturationLevel
+        return saturationLevel(self._ndtype)
+
+    def iterBlocks(self, frames = None, maxBytes = BLOCK_BYTES):
+        """ yield (indexes, block) of at most maxBytes of selected frames
+        blocks of a range are views of `imgData`, other selections are copied
+        """
+        index = self.checkedIndex(frames)
+        data = self.imgData
+        frameBytes = max(1, self._ydim * self._xdim * data.dtype.itemsize)
+        step = max(1, maxBytes // frameBytes)
+        for start in range(0, len(index), step):
+            part = index[start:start + step]
+            if isinstance(part, range):
+                # stop is -1 for a descending range ending at frame 0
+                yield part, data[part.start:part.stop if part.stop >= 0 else None:part.step] \
+                        if len(part) else data[0:0]
+            else:
+                yield part, data[part]
+
+    def frameStats(self, frames = None, saturation = None, median = True):
+        """ per-frame min, max, mean, std, median and number of saturated
+        pixels, as numpy structured array (see `quickLook.STATS_DTYPE`)
+        reduced block by block from the memory-mapped data region
+        saturation: default is `saturation`
+        """
+        from quickLook import blockStats, STATS_DTYPE
+        if saturation is None:
+            saturation = self.saturation
+        blocks = [ blockStats(block, list(part), saturation, median)
+                for part, block in self.iterBlocks(frames) ]
+        if len(blocks) == 0:
+            return np.zeros(0, dtype = STATS_DTYPE)
+        return np.concatenate(blocks)
+
+    def thumbnails(self, frames = None, factor = 4):
+        """ yield (index, thumbnail), frames downsampled by block mean of
+        factor x factor pixels, as float32
+        """
+        from quickLook import downsample
+        for part, block in self.iterBlocks(frames):
+            for i, thumbnail in zip(part, downsample(block, factor)):
+                yield i, thumbnail
+
+    def thumbnailNames(self, frames = None, outPrefix = None, fmt = "png"):
+        outPrefix = self.outputPrefix(outPrefix)
+        return [ "{}_x{:03}_thumb.{}".format(outPrefix, i, fmt)
+                for i in self.frameIndex(frames) ]
+
+    def saveThumbnails(self, frames = None, outPrefix = None, factor = 4, fmt = "png"):
+        """ save thumbnails of frames as `<outPrefix>_x000_thumb.png` (or .npy)
+        return names of saved files
+        """
+        from quickLook import saveThumbnail
+        names = self.thumbnailNames(frames, outPrefix, fmt)
+        for name, (i, thumbnail) in zip(names, self.thumbnails(frames, factor)):
+            saveThumbnail(name, thumbnail, fmt)
+        return names
+
+    def iterFrames(self, frames = None):
+        """ yield (index, frame) one by one
+        frames: frame selection, see `frameIndex`
+        """
+        if self._mmap:
+            for i in self.frameIndex(frames):
+                yield i, self.imgData[i]
+            return
+        # one read (and no decoding) per block of frames
+        index = self.frameIndex(frames)
+        step = max(1, SPE.BLOCK_BYTES // max(1, self._img_size))
+        for start in range(0, len(index), step):
+            part = index[start:start + step]
+            yield from zip(part, self.readFrames(part))
+
+    def pipelineBlocks(self, frames = None, depth = 2, stats = False, median = True):
+        """ yield (indexes, block, stats) of selected frames, block already in
+        FITS storage order and dtype (see `fitsWriter.toStorageInPlace`)
+        Blocks of at most PIPELINE_BLOCK_BYTES are read in a reader thread and
+        converted in place in a decoder thread (see `pipeline.pipeline`), so
+        reading, converting and writing by the consumer overlap. Buffers come
+        from `bufferPool.POOL`, at most 2 * depth + 3 are in flight; block is
+        only valid until the next one is requested.
+        stats: `quickLook.blockStats` of every block, otherwise stats is None
+        median: with stats, see `quickLook.blockStats`
+        """
+        from pipeline import pipeline
+        from bufferPool import POOL
+        from fitsWriter import toStorageInPlace
+        from quickLook import blockStats
+        index = self.checkedIndex(frames)
+        step = max(1, SPE.PIPELINE_BLOCK_BYTES // max(1, self._img_size))
+        shape = (step, self._ydim, self._xdim)
+        held = {} # id: buffer acquired and not yet released
+        stop = threading.Event()
+
+        def read():
+            for start in range(0, len(index), step):
+                buf = POOL.acquire(shape, self._ndtype, stop)
+                if buf is None:
+                    return
+                held[id(buf)] = buf
+                part = index[start:start + step]
+                yield part, buf, self.readInto(buf[:len(part)], part)
+
+        def decode(item):
+            part, buf, block = item
+            frameStats = blockStats(block, list(part), self.saturation, median) \
+                    if stats else None
+            with debug.span("byteswap", block.nbytes):
+                block = toStorageInPlace(block)
+            return part, buf, block, frameStats
+
+        blocks = pipeline(read(), decode, depth, stop)
+        try:
+            for part, buf, block, frameStats in blocks:
+                yield part, block, frameStats
+                POOL.release(held.pop(id(buf)))
+        finally:
+            blocks.close() # stage threads are joined
+            for buf in held.values():
+                POOL.release(buf)
+
+    @staticmethod
+    def writeHdu(hdu, name, clobber = True, output_verify = "exception"):
+        """ hdu.writeto, astropy renamed `clobber` to `overwrite`
+        """
+        import inspect
+        if 'overwrite' in inspect.signature(hdu.writeto).parameters:
+            hdu.writeto(name, overwrite = clobber, output_verify = output_verify)
+        else:
             hdu.writeto(name, clobber = clobber, output_verify = output_verify)
 
-    def spe2fits(self, **kwargs):
+    def outputNames(self, mode = "frames", frames = None, outPrefix = None):
+        """ FITS file names `spe2fits` will write with the same arguments
+        """
+        outPrefix = self.outputPrefix(outPrefix)
+        if mode == "frames":
+            return [ "{}_x{:03}.fits".format(outPrefix, i)
+                    for i in self.frameIndex(frames) ]
+        return [ "{}.fits".format(outPrefix) ]
+
+    def spe2fits(self, mode = "frames", frames = None, jobs = 1, depth = 2, **kwargs):
         """ Shortcut method for saving all frames in .SPE to FITS
-        Each FITS contains only one frame
+        mode: "frames", each FITS contains only one frame
+              "cube", one FITS with all frames as 3-D cube
+              "extensions", one FITS with one image extension per frame
+        frames: frame selection, checked (see `checkedIndex`) before anything is written
+        jobs: number of processes converting chunks of frames
+              output is the same as with jobs = 1
+        depth: queue depth of the threaded read / convert / write pipeline
+               (see `pipelineBlocks`), 0 to convert frame by frame
+        kwargs: outPrefix, clobber, output_verify, stats
+        Files with several ROIs are written by `_writeRois` in this process.
         """
-        for count in range(self._img_count):
-            print(count)
-            datas = self.loadSpeImg(count)
-            self.writeToFits(datas, **kwargs)
+        if mode == "cube":
+            return self.writeToFitsCube(frames, jobs = jobs, depth = depth, **kwargs)
+        if mode == "extensions":
+            return self.writeToFitsCube(frames, extensions = True, jobs = jobs,
+                    depth = depth, **kwargs)
+        if mode != "frames":
+            raise ValueError("unknown output mode: {}".format(mode))
+        index = self.checkedIndex(frames)
+        if len(self._rois) > 1:
+            kwargs.pop("fast", None)
+            return self._writeRois("frames", index, **kwargs)
+        if jobs > 1:
+            return self._runChunks(_writeFrameChunk, index, jobs,
+                    lambda start, stop: (index[start:stop], dict(kwargs, depth = depth)))
+        if depth > 0 and kwargs.get("compression") is None and kwargs.get("fast", True):
+            kwargs.pop("compression", None)
+            kwargs.pop("fast", None)
+            return self._writeFramesPipelined(index, depth, **kwargs)
+        if kwargs.pop("stats", False):
+            # statistics are reduced over blocks, not frame by frame
+            from quickLook import blockStats
+            for part, block in self.iterBlocks(index):
+                self.writeToFits(dict(zip(part, block)), stats = blockStats(
+                    block, list(part), self.saturation), **kwargs)
+            return
+        for count, frame in self.iterFrames(index):
+            self.writeToFits({count: frame}, **kwargs)
 
     def _initFitsHeader(self):
         fitshdr = fits.header.Header()
@@ -206,33 +1080,99 @@ class SPE:
 
     @property
     def datatype(self):
+        """ header key 'datatype' (0 float, 1 long, 2 short, 3 unsigned short,
+        5, 6, 8 of LightField), formerly its struct format ('f', 'l', 'h', 'H',
+        see STRUCT_TO_NUMPY), numpy dtype of pixels is SPE_DATATYPE[datatype]
+        """
         if not hasattr(self, '_datatype'):
             self._datatype = None # just init this var
         return self._datatype
 
     @datatype.setter
     def datatype(self, datatype):
-        " bind ndtype and datatype "
+        " bind ndtype and datatype (header key 'datatype') "
+        self._ndtype = SPE.pixelDtype(datatype)
         self._datatype = datatype
-        self._ndtype = SPE.STRUCT_TO_NUMPY[datatype]
 
-    def _extractInfo(self):
-        """ Extract information and construct FITS header from .SPE header
+    def _extractInfo(self, roiBlock):
+        """ Extract information needed for frame access from .SPE header
+        roiBlock: ROIinfoblk records, see `SpeHeaderLayout.decode`
         """
         self._stripIgnore()
 
         self._img_count = self._spe_header['NumFrames'][0]
         self._xdim = self._spe_header['xdim'][0]
         self._ydim = self._spe_header['ydim'][0]
-        self.datatype = SPE.SPE_DATATYPE.get(self._spe_header['datatype'][0], 'f')
-        self._img_size = self._xdim * self._ydim * struct.calcsize(self.datatype)
+        self.datatype = self._spe_header['datatype'][0]
+        self._img_size = self._xdim * self._ydim * self._ndtype.itemsize
+        self._rois = self._loadRois(roiBlock)
 
+    def _buildFitsHeader(self):
+        """ Construct FITS header from .SPE header
+        """
+        self._fits_header = self._initFitsHeader()
         for k, v in self._spe_header.items():
-            self._fitshdr[k.upper()] = v # why astropy does not auto upper or ignore case..
+            self._fits_header[k.upper()] = v # why astropy does not auto upper or ignore case..
 
         self.renameHeaderKey('exp_sec', 'EXPOSURE')
         self.renameHeaderKey('ReadoutTime', 'READTIME', 'Experiment readout time in ms')
         self.renameHeaderKey('DetTemperature', 'TEMP')
+        return self._fits_header
+
+    def _loadRois(self, roiBlock):
+        """ ROIinfoblk records of the NumROI regions every frame is made of
+        One record covering the whole frame for a single ROI, or if the
+        regions do not add up to the xdim x ydim pixels of a frame.
+        roiBlock: all ROIMAX records of the header
+        """
+        numRoi = self._spe_header.get('NumROI', (0, ''))[0]
+        whole = np.array([(0, max(0, self._xdim - 1), 1, 0, max(0, self._ydim - 1), 1)],
+                dtype = SPE.ROI_DTYPE)
+        rois = roiBlock[:max(1, min(numRoi, len(roiBlock)))].copy()
+        shapes = [ SPE.roiShape(roi) for roi in rois ]
+        if len(rois) == 1 and shapes[0] == (self._ydim, self._xdim):
+            return rois
+        if len(rois) > 1 and sum(ny * nx for ny, nx in shapes) == self._xdim * self._ydim:
+            return rois
+        if numRoi > 1:
+            print("Warning: {}: {} ROIs of {} do not make up a {}x{} frame, read as one"
+                    .format(self._filename, numRoi, shapes, self._xdim, self._ydim))
+        return whole
+
+    @property
+    def rois(self):
+        """ ROIinfoblk records (see ROI_DTYPE) of the regions every frame is
+        concatenated from, in order, one record if there is a single ROI
+        """
+        return self._rois
+
+    @property
+    def roiShapes(self):
+        """ [(ydim, xdim)] of every ROI, binning applied
+        """
+        return [ SPE.roiShape(roi) for roi in self._rois ]
+
+    @staticmethod
+    def roiShape(roi):
+        """ (ydim, xdim) of one ROI_DTYPE record
+        """
+        return ((int(roi['endy']) - int(roi['starty'])) // max(1, int(roi['groupy'])) + 1,
+                (int(roi['endx']) - int(roi['startx'])) // max(1, int(roi['groupx'])) + 1)
+
+    def splitRois(self, data):
+        """ views (..., ny, nx) of every ROI of data, without copying
+        data: frame (ydim, xdim) or frames (n, ydim, xdim) of this file,
+              e.g. from `readFrames` or `imgData`
+        """
+        data = np.asarray(data)
+        lead = data.shape[:-2]
+        flat = data.reshape(lead + (-1,))
+        views = []
+        offset = 0
+        for ny, nx in self.roiShapes:
+            views.append(flat[..., offset:offset + ny * nx].reshape(lead + (ny, nx)))
+            offset += ny * nx
+        return views
 
     def _stripIgnore(self):
         """ Remove some headers in .SPE file
@@ -255,40 +1195,114 @@ class SPE:
             print("Warning:", e)
 
     # Some header to be added:  ROIinfo, type,
-    # TODO save header defination to python
     @staticmethod
     def loadHeadersDef(headerfile = "WINHEAD.TXT") -> [{}]:
         """ load/parse header defination file
         """
         import extractHeaderDesc as H
-        print(headerfile)
         headers = H.getHeaders(headerfile)
         return headers
 
     @staticmethod
-    def loadSpeHeader(fileObj, headerDef):
+    def pixelDtype(datatype):
+        """ numpy dtype of pixels for header key 'datatype'
+        """
+        try:
+            return np.dtype(SPE.SPE_DATATYPE[datatype])
+        except KeyError:
+            raise ValueError("unsupported .SPE datatype: {}".format(datatype))
+
+    @staticmethod
+    def expectedFileSize(filename, headerfile = None):
+        """ size of a completely written .SPE, from its header only, up to
+        the end of its frames (LightField's SPE 3.0 has an XML footer after)
+        return None if even the header is not complete yet
+        """
+        with open(filename, "rb") as fileObj:
+            headerData = fileObj.read(SPE.SPE_DATA_OFFSET)
+        if len(headerData) < SPE.SPE_DATA_OFFSET:
+            return None
+        header = SPE.getHeaderLayout(headerfile).decode(headerData)
+        itemsize = SPE.pixelDtype(header['datatype'][0]).itemsize
+        return SPE.SPE_DATA_OFFSET + header['NumFrames'][0] * \
+                header['xdim'][0] * header['ydim'][0] * itemsize
+
+    @staticmethod
+    def findHeaderFile(headerfile = None):
+        """ absolute path of header defination file
+        relative name is looked up in current directory, then beside this module
+        """
+        if headerfile is None:
+            headerfile = SPE.SPE_HEADER_FILE
+        if not os.path.isabs(headerfile) and not os.path.exists(headerfile):
+            besideModule = os.path.join(
+                    os.path.dirname(os.path.abspath(__file__)), headerfile)
+            if os.path.exists(besideModule):
+                headerfile = besideModule
+        return os.path.abspath(headerfile)
+
+    @staticmethod
+    def getHeaderLayout(headerfile = None):
+        """ compiled header defination, parsed once per process
+        By default it comes from the pre-generated `winhead` module,
+        the text file is only parsed for a custom headerfile.
+        Cached by header file path, reparsed when file's mtime changes,
+        so different header dialects can be used at the same time.
+        """
+        if headerfile is None:
+            with SPE._header_layouts_lock:
+                cached = SPE._header_layouts.get(None)
+                if cached is not None:
+                    return cached[1]
+                try:
+                    import winhead
+                except ImportError:
+                    pass
+                else:
+                    layout = SpeHeaderLayout(winhead.HEADERS)
+                    SPE._header_layouts[None] = (None, layout)
+                    return layout
+        headerfile = SPE.findHeaderFile(headerfile)
+        mtime = os.stat(headerfile).st_mtime_ns
+        with SPE._header_layouts_lock:
+            cached = SPE._header_layouts.get(headerfile)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+            layout = SpeHeaderLayout(SPE.loadHeadersDef(headerfile))
+            SPE._header_layouts[headerfile] = (mtime, layout)
+            return layout
+
+    @staticmethod
+    def invalidateHeaderLayout(headerfile = None):
+        """ drop cached header defination, all of them if headerfile is None
+        (the built-in one is compiled again from `winhead` on next use)
+        """
+        with SPE._header_layouts_lock:
+            if headerfile is None:
+                SPE._header_layouts.clear()
+            else:
+                SPE._header_layouts.pop(SPE.findHeaderFile(headerfile), None)
+
+    @staticmethod
+    def reloadHeaderLayout(headerfile = None):
+        """ force reparsing header defination file
+        """
+        SPE.invalidateHeaderLayout(headerfile)
+        return SPE.getHeaderLayout(headerfile)
+
+    @staticmethod
+    def loadSpeHeader(fileObj, headerDef, rois = False):
         """ load and save .SPE file header
         fileObj:  file handler(opened file, can be read())
         headerDef: [{}], keys: 'offset', 'type', 'key', 'comment'
+            or SpeHeaderLayout compiled from it
+        rois: see `SpeHeaderLayout.decode`
         """
-        headerDict = {}
+        if not isinstance(headerDef, SpeHeaderLayout):
+            headerDef = SpeHeaderLayout(headerDef)
         fileObj.seek(0)
         headerData = fileObj.read(SPE.SPE_DATA_OFFSET)
-        for header in headerDef:
-            #print(header)
-            key = header['key']
-            offset = header['offset']
-            type_ = header['type']
-            comment = header['comment']
-            fmt, counts, size, key = SPE.parseFormat(type_, key)
-            SPE.addToHeader(headerDict, headerData, key,
-                    offset = offset,
-                    fmt = fmt,
-                    counts = counts,
-                    length = size,
-                    comment = comment,
-                    )
-        return headerDict
+        return headerDef.decode(headerData, rois)
 
     @staticmethod
     def parseFormat(type_, key):
@@ -377,8 +1391,180 @@ class SPE:
             return ''
         return val
 
+def _writeFrameChunk(filename, headerfile, frames, kwargs):
+    """ process worker of `SPE.spe2fits`, one FITS per frame
+    return (None, timing snapshot), see `debug.collecting`
+    """
+    with debug.collecting() as stats:
+        speHandler = SPE(filename, headerfile, mmap = True)
+        try:
+            speHandler.spe2fits(mode = "frames", frames = frames, **kwargs)
+        finally:
+            speHandler.close()
+    return None, stats.snapshot()
+
+def _writeCubeChunk(filename, headerfile, name, index, extensions,
+        start, stop, offset, output_verify, stats = False, depth = 2):
+    """ process worker of `SPE.writeToFitsCube`
+    fill frames index[start:stop] into preallocated name from offset,
+    through `SPE.pipelineBlocks` (buffers of this worker's `bufferPool` share)
+    unless depth is 0
+    return (statistics of the frames if stats else None, timing snapshot),
+    see `debug.collecting`
+    """
+    from fitsWriter import FitsStreamWriter
+    with debug.collecting() as timing:
+        speHandler = SPE(filename, headerfile, mmap = True)
+        try:
+            header, extHeader = speHandler._cubeHeaders(index, extensions,
+                    output_verify, stats)
+            with FitsStreamWriter(name, offset = offset,
+                    dtype = speHandler.imgData.dtype) as writer:
+                if depth > 0:
+                    frameStats = speHandler._writeCubePipelined(writer,
+                            index[start:stop], extHeader, depth, stats)
+                else:
+                    frameStats = speHandler._writeCubeFrames(writer,
+                            index[start:stop], extHeader, stats)
+        finally:
+            speHandler.close()
+    return frameStats, timing.snapshot()
+
+def _compressChunk(filename, headerfile, frames, compression, stats, output_verify):
+    """ process worker of `SPE.writeToFitsCube` with compression
+    return ([serialized compressed extension of every frame], timing snapshot)
+    """
+    with debug.collecting() as timing:
+        speHandler = SPE(filename, headerfile, mmap = True)
+        try:
+            chunk = list(speHandler._compressFrames(frames, compression,
+                stats, output_verify))
+        finally:
+            speHandler.close()
+    return chunk, timing.snapshot()
+
+class SpeHeaderLayout:
+    """ Header defination compiled into one numpy structured dtype
+    The whole header is decoded by one `np.frombuffer`, then keys are
+    expanded ( a[b] -> a_0 .. a_<b-1> ) and null characters stripped
+    the same way as `SPE.addToHeader` and `SPE.checkVal` do.
+    """
+    def __init__(self, headerDef):
+        """
+        headerDef: [{}], keys: 'offset', 'type', 'key', 'comment'
+        """
+        self._headerDef = list(headerDef)
+        names, formats, offsets = [], [], []
+        self._fields = [] # [(key, comment, fmt, counts)]
+        for header in headerDef:
+            fmt, counts, length, key = SPE.parseFormat(header['type'], header['key'])
+            matched = re.match(r'(\d*)(\w)$', fmt)
+            size, code = matched.groups()
+            size = int(size) if size != '' else 1
+            if code == 's':
+                dtype = 'S' + str(size)
+                shape = counts
+            else:
+                dtype = SPE.FMT_TO_DTYPE[code]
+                shape = counts if size == 1 else size
+            names.append(str(len(names))) # keys are not unique, e.g. calib
+            formats.append((dtype, (shape,)) if shape > 1 else dtype)
+            offsets.append(header['offset'])
+            self._fields.append((key, header['comment'], fmt, shape))
+        # ROIinfoblk is not in the key list, last so that it has no key
+        names.append('ROIinfoblk')
+        formats.append((SPE.ROI_DTYPE, (SPE.SPE_CONSTS['ROIMAX'],)))
+        offsets.append(SPE.ROI_OFFSET)
+        self._dtype = np.dtype({
+            'names': names,
+            'formats': formats,
+            'offsets': offsets,
+            'itemsize': max(SPE.SPE_DATA_OFFSET,
+                np.dtype({'names': names, 'formats': formats,
+                    'offsets': offsets}).itemsize),
+            })
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def keys(self):
+        """ key names, before a[b] expansion
+        """
+        return [ field[0] for field in self._fields ]
+
+    def decodedKeys(self, keys = None):
+        """ names given by `decode` to keys (default all), in layout order,
+        a[b] expanded to a_0 .. a_<b-1>
+        """
+        names = []
+        for key, comment, fmt, counts in self._fields:
+            if keys is not None and key not in keys:
+                continue
+            if counts == 1:
+                names.append(key)
+            else:
+                names += [ "{}_{}".format(key, i) for i in range(counts) ]
+        return names
+
+    def select(self, keys):
+        """ layout decoding only the given keys, e.g. for indexing many files
+        """
+        keys = set(keys)
+        return SpeHeaderLayout([ header for header, field
+            in zip(self._headerDef, self._fields) if field[0] in keys ])
+
+    def encode(self, values):
+        """ raw header bytes from {key: val}, inverse of `decode` for
+        un-expanded keys, other fields are zero, e.g. for synthetic files
+        """
+        record = np.zeros(1, dtype = self._dtype)
+        for name, (key, comment, fmt, counts) in zip(self._dtype.names, self._fields):
+            if key in values:
+                val = values[key]
+                record[name] = val.encode() if isinstance(val, str) else val
+        return record.tobytes()
+
+    def decode(self, headerData, rois = False):
+        """ decode raw header bytes into {key: (val, comment)}
+        rois: return ({key: (val, comment)}, ROIinfoblk records), all
+              ROIMAX of them as array of `SPE.ROI_DTYPE`
+        raise ValueError if headerData is shorter than a .SPE header
+        """
+        if len(headerData) < SPE.SPE_DATA_OFFSET:
+            raise ValueError("incomplete .SPE header")
+        record = np.frombuffer(headerData, dtype = self._dtype, count = 1)[0]
+        headerDict = {}
+        for (key, comment, fmt, counts), val in zip(self._fields, record.item()):
+            if counts == 1:
+                headerDict[key] = (SpeHeaderLayout.checkVal(val, fmt), comment)
+                continue
+            for i, subval in enumerate(val.tolist()):
+                newkey = "{key}_{index}".format(
+                        key = key,
+                        index = i,
+                        )
+                headerDict[newkey] = (SpeHeaderLayout.checkVal(subval, fmt), comment)
+        if rois:
+            return headerDict, record['ROIinfoblk']
+        return headerDict
+
+    @staticmethod
+    def checkVal(val, fmt):
+        """ like `SPE.checkVal`, numpy has already dropped trailing nulls
+        """
+        if 's' in fmt:
+            return val.partition(b'\x00')[0].decode()
+        if 'c' in fmt and val == b'':
+            return ''
+        return val
+
 if __name__ == '__main__':
-    filename = sys.argv[1]
-    speHandler = SPE(filename)
-    speHandler.spe2fits()
+    # worker processes of a frozen (cx_Freeze) build run the worker, not the CLI
+    from multiprocessing import freeze_support
+    freeze_support()
+    # spe2fits.py <filename>.SPE ..., see speBatch.py for options
+    from speBatch import main
+    sys.exit(main())
 
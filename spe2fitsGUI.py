@@ -13,7 +13,6 @@ image sub
 import sys
 import os
 import traceback
-import re
 from warnings import warn
 from functools import partial
 from collections import deque
@@ -22,7 +21,6 @@ from pathlib import Path # New in version 3.4
 
 # ref: https://github.com/gorakhargosh/watchdog
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
 
 # ref: http://effbot.org/tkinterbook/
 import tkinter as tk
@@ -33,32 +31,13 @@ from tkinter import ttk
 
 #sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 from spe2fits import SPE
+from speBatch import getOutputPrefix
+from speWatch import SettledFileHandler
+from speManifest import Manifest, sourceState
 from eventQueue import *
+import debug
 from debug import debug_method_info
 
-class customerDirHandler(FileSystemEventHandler):
-    SPE_FILE_PATTERN = re.compile(".*\.spe", re.IGNORECASE)
-    def __init__(self, hook = None):
-        self._hook = hook
-
-    def set_hook(self, hook):
-        self._hook = hook
-
-    @debug_method_info()
-    def on_created(self, event):
-        super().on_created(event)
-        if event.is_directory:
-            return
-        newfile = os.path.abspath(event.src_path)
-        print("newfile", newfile)
-        if not customerDirHandler.SPE_FILE_PATTERN.match(newfile):
-            return
-        try:
-            print("process hook")
-            self._hook(newfile)
-        except Exception as e:
-            print(e)
-
 @debug_method_info()
 def yieldFilesUnderDirectory(dirname, match = None):
     """ yield all file names under the directory 'dirname' recursively
@@ -69,26 +48,7 @@ def yieldFilesUnderDirectory(dirname, match = None):
     for match in matched:
         yield str(match.absolute())
 
-def getOutputPrefix(oldname, outputDir, oldPrefix):
-    """ get output path prefix
-    oldname: filename to be converted
-    outputDir: output directory name
-    oldPrefix: file's path will need to cut the prefix first
-    e.g.: path/b.ext -> output/b ( prefix is path )
-    e.g.: path/to/c.ext -> output/to/c ( prefix is path )
-    """
-    # XXX is os.path.abspath necessary ?
-    if oldPrefix is not None:
-        relpath = os.path.relpath( os.path.abspath(oldname),
-                os.path.abspath(oldPrefix) )
-    else:
-        relpath = os.path.basename(oldname)
-    relpath = os.path.splitext(relpath)[0]
-    print("relpath:", relpath)
-    return os.path.join( os.path.abspath(outputDir), relpath )
-
 class ConvertEvent(EventQueue):
-    _queue_router = { et: Queue() for et in EventType }
     def __init__(self, master, fileIter, outputDir, oldPrefix, showComplete):
         super().__init__(children = fileIter)
         self.master = master
@@ -97,9 +57,13 @@ class ConvertEvent(EventQueue):
         self.outputDir = outputDir
         self.oldPrefix = oldPrefix
         self.showComplete = showComplete
-
-    def createQueue(self):
-        return ConvertEvent._queue_router
+        self.stats = debug.Stats() # time spent on files of this event only
+        try:
+            # shared with concurrent events converting into outputDir
+            self.manifest = Manifest.shared(outputDir)
+        except Exception as e: # e.g. damaged manifest, convert everything
+            warn("manifest of {} not used: {}".format(outputDir, e))
+            self.manifest = None
 
     def on_started(self):
         self.master.onFileConvertStart()
@@ -107,17 +71,31 @@ class ConvertEvent(EventQueue):
     def on_child_process(self, child):
         # onefile is child
         super().on_child_process(child)
-        return self.master.convertOneFile(child, self.outputDir, self.oldPrefix)
+        with debug.collecting() as stats:
+            try:
+                with debug.span("convert"):
+                    return self.master.convertOneFile(child, self.outputDir,
+                            self.oldPrefix, self.manifest)
+            finally:
+                self.stats.merge(stats.snapshot())
 
     def on_child_done(self, result):
         super().on_child_done(result)
         self.fileallcount += 1
+        self.master.onFileProgress(self.childDoneCount, self.childCount,
+                self.allDistributed)
         if result:
             self.filecount += 1
             self.master.onFileConverted()
 
     def on_finished(self):
         super().on_finished()
+        if self.manifest is not None:
+            try:
+                self.manifest.flush()
+            except OSError as e:
+                warn(str(e))
+        print(self.stats.summary("total"))
         self.master.onFilesAllConverted(self.fileallcount, self.filecount, \
                 self.outputDir, self.showComplete)
 
@@ -189,6 +167,12 @@ class Application(tk.Frame):
         self.convertProgressNum = tk.Label(self,
                 textvariable = self.convertNumber)
         self.convertProgress.place(x=60+self.chooseDir.winfo_reqwidth(), y=100)
+        ## completed/total of running conversion, total ends with '+' while
+        ## the directory is still being walked
+        self.convertProgressText = tk.StringVar(self, "", "convertProgressText")
+        self.convertProgressTotal = tk.Label(self,
+                textvariable = self.convertProgressText)
+        self.convertProgressTotal.place(x=270+self.chooseDir.winfo_reqwidth(), y=100)
         self.convertProgressNum.place(x=65+self.chooseFile.winfo_reqwidth(), y=50)
 
         # select dir to listen
@@ -288,7 +272,7 @@ class Application(tk.Frame):
         """
         if not hasattr(self, "_listener"):
             self._listener = Observer()
-            self._listen_handler = customerDirHandler(self.on_created)
+            self._listen_handler = SettledFileHandler(self.on_created)
             self._listener.start()
         return self._listener
 
@@ -377,12 +361,24 @@ class Application(tk.Frame):
         convert_event = ConvertEvent(self, fileIter, outputDir, oldPrefix, showComplete)
         convert_event.startEvents()
 
-    def convertOneFile(self, onefile, outputDir, oldPrefix):
+    def convertOneFile(self, onefile, outputDir, oldPrefix, manifest = None):
+        """ convert onefile, unless manifest says it is unchanged since
+        last conversion and its outputs are complete (and overwriting
+        is not asked for)
+        """
         if onefile in self.convertingQueue:
             return False
+        overwrite = self.overWriteFileFlag.get()
+        if manifest is not None and not overwrite and \
+                manifest.isUpToDate(onefile, "frames"):
+            print("up to date:", onefile)
+            return True
         try:
             result = True
             self.convertingQueue.append(onefile)
+            if manifest is not None:
+                state = sourceState(onefile)
+                manifest.remove(onefile)
             outPrefix = getOutputPrefix( onefile,
                     outputDir, oldPrefix )
             print("output prefix:", outPrefix)
@@ -393,9 +389,12 @@ class Application(tk.Frame):
             # TODO handle file existence more friendly
             speHandler.spe2fits(
                     outPrefix = outPrefix,
-                    clobber = self.overWriteFileFlag.get(),
+                    clobber = overwrite,
                     output_verify = "warn", # XXX "warn" also throw exception?
                     )
+            if manifest is not None:
+                manifest.add(onefile, state,
+                        speHandler.outputNames(outPrefix = outPrefix), mode = "frames")
         except OSError as e:
             warn(str(e))
             result = False
@@ -417,6 +416,10 @@ class Application(tk.Frame):
     def onFileConverted(self):
         self.convertNumber.set(self.convertNumber.get() + 1)
 
+    def onFileProgress(self, done, total, allDistributed):
+        self.convertProgressText.set("{done}/{total}{more}".format(
+            done = done, total = total, more = "" if allDistributed else "+"))
+
     def onFilesAllConverted(self, fileallcount, filecount, outputDir,
             showComplete = True):
         self.convertProgress.stop()
@@ -433,6 +436,7 @@ class Application(tk.Frame):
     def cleanup(self):
         self.listener.stop()
         self.listener.join()
+        self._listen_handler.stop()
         self.parent.destroy()
 
 
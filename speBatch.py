@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+
+"""
+Headless batch conversion of many .SPE files to FITS
+
+    speBatch.py [-o OUTDIR] [-j N] [-J N] [--mode frames|cube|extensions]
+                [--exists overwrite|skip|fail] [--incremental]
+                [--stats] [--thumbnails png|npy]
+                [--compress rice|gzip|gzip2|hcompress] [--quantize Q]
+                [--buffer-mb MB] [--fsync] [--timing] [--profile DIR]
+                FILE|DIR|GLOB ...
+
+Files are converted in a pool of processes, one file per task, and
+frames of a large file can be split across processes too ( -J ).
+Output of a directory argument keeps its relative layout under OUTDIR,
+like the GUI does ( see `getOutputPrefix` ).
+With --incremental, sources recorded in OUTDIR's manifest as converted,
+unchanged and with complete outputs are skipped ( see speManifest ).
+Exit code is 0 if all files are converted (or skipped), 1 if any failed.
+"""
+
+import sys
+import os
+import glob
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path # New in version 3.4
+
+import debug
+
+CONVERTED = "OK"
+SKIPPED = "SKIP"
+FAILED = "FAIL"
+
+def getOutputPrefix(oldname, outputDir, oldPrefix):
+    """ get output path prefix
+    oldname: filename to be converted
+    outputDir: output directory name
+    oldPrefix: file's path will need to cut the prefix first
+    e.g.: path/b.ext -> output/b ( prefix is path )
+    e.g.: path/to/c.ext -> output/to/c ( prefix is path )
+    """
+    # XXX is os.path.abspath necessary ?
+    if oldPrefix is not None:
+        relpath = os.path.relpath( os.path.abspath(oldname),
+                os.path.abspath(oldPrefix) )
+    else:
+        relpath = os.path.basename(oldname)
+    relpath = os.path.splitext(relpath)[0]
+    return os.path.join( os.path.abspath(outputDir), relpath )
+
+def expandSources(sources):
+    """ yield (filename, oldPrefix) for files, directories and glob patterns
+    .SPE under a directory are found recursively, oldPrefix is the directory
+    """
+    for source in sources:
+        if os.path.isdir(source):
+            for path in sorted(Path(source).rglob("*")):
+                if path.suffix.lower() == ".spe" and path.is_file():
+                    yield str(path.absolute()), os.path.abspath(source)
+        elif glob.has_magic(source):
+            for filename in sorted(glob.glob(source, recursive = True)):
+                if os.path.isfile(filename):
+                    yield os.path.abspath(filename), None
+        else:
+            yield os.path.abspath(source), None
+
+def convertFile(filename, outputDir = None, oldPrefix = None,
+        mode = "frames", exists = "overwrite", output_verify = "warn", frameJobs = 1,
+        stats = False, thumbnails = None, thumbFactor = 4, fsync = False,
+        compression = None):
+    """ convert one .SPE, return (filename, status, outputs or error message)
+    exists: policy for existing output, "overwrite", "skip" (only missing
+            outputs are written) or "fail"
+    frameJobs: number of processes converting frames of this file
+    stats: write DATAMIN, DATAMAX... into FITS headers
+    thumbnails: None, "png" or "npy", save a thumbnail of every frame,
+                downsampled by thumbFactor
+    fsync: flush outputs to disk before returning
+    compression: `fitsWriter.Compression`, write tile-compressed images
+    Timed as span "convert" (see debug), cProfiled if SPE2FITS_PROFILE is set.
+    """
+    with debug.span("convert"), debug.profiling(os.path.basename(filename)):
+        return _convertFile(filename, outputDir, oldPrefix, mode, exists,
+                output_verify, frameJobs, stats, thumbnails, thumbFactor, fsync,
+                compression)
+
+def _convertFile(filename, outputDir, oldPrefix, mode, exists, output_verify,
+        frameJobs, stats, thumbnails, thumbFactor, fsync, compression):
+    from spe2fits import SPE
+    speHandler = None
+    try:
+        outPrefix = None
+        if outputDir is not None:
+            outPrefix = getOutputPrefix(filename, outputDir, oldPrefix)
+            os.makedirs(os.path.dirname(outPrefix), exist_ok = True)
+        speHandler = SPE(filename)
+        fitsNames = speHandler.outputNames(mode, outPrefix = outPrefix)
+        thumbNames = []
+        if thumbnails is not None:
+            thumbNames = speHandler.thumbnailNames(outPrefix = outPrefix, fmt = thumbnails)
+        outputs = fitsNames + thumbNames
+        frames = thumbFrames = None # all
+        if exists == "skip":
+            if all(map(os.path.exists, outputs)):
+                return filename, SKIPPED, outputs
+            # complete a partial conversion, existing outputs are left alone
+            index = list(speHandler.frameIndex(None))
+            if mode == "frames":
+                frames = missingFrames(index, fitsNames)
+            elif os.path.exists(fitsNames[0]):
+                frames = []
+            thumbFrames = missingFrames(index, thumbNames)
+        if frames is None or len(frames) > 0:
+            speHandler.spe2fits(mode = mode, frames = frames, outPrefix = outPrefix,
+                    clobber = exists != "fail", output_verify = output_verify,
+                    jobs = frameJobs, stats = stats, compression = compression)
+        if thumbnails is not None and (thumbFrames is None or len(thumbFrames) > 0):
+            speHandler.saveThumbnails(thumbFrames, outPrefix = outPrefix,
+                    factor = thumbFactor, fmt = thumbnails)
+        if fsync:
+            for output in outputs:
+                with debug.span("fsync"), open(output, "rb+") as fileObj:
+                    os.fsync(fileObj.fileno())
+        return filename, CONVERTED, outputs
+    except Exception as e:
+        return filename, FAILED, "".join(
+                traceback.format_exception_only(type(e), e)).strip()
+    finally:
+        if speHandler is not None:
+            speHandler.close()
+
+def missingFrames(index, names):
+    """ frames of index whose output (of names, in the same order) is missing
+    """
+    return [ i for i, name in zip(index, names) if not os.path.exists(name) ]
+
+def convertFileTimed(*args, **kwargs):
+    """ `convertFile`, return (its result, timing snapshot of the file)
+    """
+    with debug.collecting() as timing:
+        result = convertFile(*args, **kwargs)
+    return result, timing.snapshot()
+
+def convertFiles(sources, outputDir = None, jobs = 1, onTiming = None, **kwargs):
+    """ convert (filename, oldPrefix) pairs, yield results of `convertFile`
+    in completion order
+    jobs: number of worker processes, 1 converts in this process
+    onTiming: called with (filename, timing snapshot) of every file
+    Timing of worker processes is merged into `debug.STATS` of this one,
+    which also shares its `bufferPool` budget among them.
+    A worker failing as a whole (e.g. a crashed process breaking the pool)
+    is reported as FAILED for its files, the others are still yielded.
+    """
+    if jobs <= 1:
+        for filename, oldPrefix in sources:
+            result, timing = convertFileTimed(filename, outputDir, oldPrefix, **kwargs)
+            if onTiming is not None:
+                onTiming(filename, timing)
+            yield result
+        return
+    from bufferPool import POOL, setBudget
+    with ProcessPoolExecutor(max_workers = jobs, initializer = setBudget,
+            initargs = (POOL.budget // jobs,)) as executor:
+        futures = { executor.submit(convertFileTimed, filename, outputDir, oldPrefix,
+            **kwargs): filename for filename, oldPrefix in sources }
+        for future in as_completed(futures):
+            try:
+                result, timing = future.result()
+            except Exception as e:
+                result, timing = (futures[future], FAILED, "".join(
+                    traceback.format_exception_only(type(e), e)).strip()), {}
+            debug.merge(timing)
+            if onTiming is not None:
+                onTiming(result[0], timing)
+            yield result
+
+def compressionSummary(timing):
+    """ "raw MB -> written MB (ratio)" of compressed outputs in timing, or None
+    """
+    raw = timing.get("compress", [0, 0, 0, 0])[3]
+    written = timing.get("compressed", [0, 0, 0, 0])[3]
+    if raw == 0 or written == 0:
+        return None
+    return "compressed {:.1f} MB to {:.1f} MB (ratio {:.2f}) in {:.1f} s".format(
+            raw / 1e6, written / 1e6, raw / written, timing["compress"][1])
+
+def printTiming(filename, timing):
+    """ one line of wall seconds per stage of a file, to stderr
+    """
+    print("TIME", filename, " ".join("{}={:.3f}s".format(name, item[1])
+        for name, item in sorted(timing.items())), sep = "\t", file = sys.stderr)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+            description = "Convert .SPE files generated by WinViewer to FITS")
+    parser.add_argument("sources", nargs = "+", metavar = "FILE|DIR|GLOB",
+            help = ".SPE files, directories (searched recursively) or glob patterns")
+    parser.add_argument("-o", "--output-dir", default = None,
+            help = "output directory, default is beside each .SPE")
+    parser.add_argument("-j", "--jobs", type = int, default = 1,
+            help = "number of worker processes (0 for all cores)")
+    parser.add_argument("-J", "--frame-jobs", type = int, default = 1,
+            help = "number of processes splitting the frames of each file")
+    parser.add_argument("--mode", default = "frames",
+            choices = ("frames", "cube", "extensions"),
+            help = "one FITS per frame, one 3-D cube, or one extension per frame")
+    parser.add_argument("--exists", default = "overwrite",
+            choices = ("overwrite", "skip", "fail"),
+            help = "what to do when output exists")
+    parser.add_argument("--stats", action = "store_true",
+            help = "write DATAMIN, DATAMAX, DATAMEAN... into FITS headers")
+    parser.add_argument("--thumbnails", choices = ("png", "npy"), default = None,
+            help = "also save a downsampled thumbnail of every frame")
+    parser.add_argument("--thumb-factor", type = int, default = 4,
+            help = "thumbnail downsampling factor, default %(default)s")
+    parser.add_argument("--compress", default = None,
+            choices = ("rice", "gzip", "gzip2", "hcompress"),
+            help = "write tile-compressed images, frames are compressed in -J processes")
+    parser.add_argument("--quantize", type = float, default = 16.0,
+            help = "quantization level of float images, 0 for lossless (GZIP)")
+    parser.add_argument("--hcomp-scale", type = float, default = 0,
+            help = "HCOMPRESS scale of integer images, 0 for lossless")
+    parser.add_argument("--buffer-mb", type = float, default = None,
+            help = "memory for frame buffers of all processes, in MB")
+    parser.add_argument("--fsync", action = "store_true",
+            help = "flush every output to disk before reporting it converted")
+    parser.add_argument("--timing", action = "store_true",
+            help = "print time spent per stage, for every file and the batch")
+    parser.add_argument("--profile", metavar = "DIR", default = None,
+            help = "save a cProfile of every file into DIR")
+    parser.add_argument("--incremental", action = "store_true",
+            help = "skip files unchanged since recorded in manifest of OUTDIR")
+    parser.add_argument("--verify-header", action = "store_true",
+            help = "with --incremental, also compare hash of .SPE header")
+    args = parser.parse_args(argv)
+    if args.incremental and args.output_dir is None:
+        parser.error("--incremental needs --output-dir")
+
+    if args.profile is not None:
+        os.environ["SPE2FITS_PROFILE"] = os.path.abspath(args.profile) # for workers too
+    if args.buffer_mb is not None:
+        from bufferPool import setBudget
+        setBudget(args.buffer_mb * 1e6)
+    compression = None
+    if args.compress is not None:
+        from fitsWriter import Compression
+        compression = Compression(args.compress, quantize = args.quantize,
+                hcompScale = args.hcomp_scale)
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    sources = list(expandSources(args.sources))
+    if len(sources) == 0:
+        print("No .SPE files found", file = sys.stderr)
+        return 2
+
+    counts = { CONVERTED: 0, SKIPPED: 0, FAILED: 0 }
+    manifest = None
+    if args.incremental:
+        from speManifest import Manifest, sourceState, conversionOptions
+        os.makedirs(args.output_dir, exist_ok = True)
+        manifest = Manifest.shared(args.output_dir)
+        options = conversionOptions(args.stats, compression, args.thumbnails,
+                args.thumb_factor)
+        states = {}
+        todo = []
+        for filename, oldPrefix in sources:
+            if manifest.isUpToDate(filename, args.mode, args.verify_header, options):
+                counts[SKIPPED] += 1
+                outputs = [ output for output, size in manifest.get(filename)["outputs"] ]
+                print(SKIPPED, filename, ",".join(outputs), sep = "\t")
+                continue
+            try:
+                states[filename] = sourceState(filename)
+            except OSError:
+                pass # reported by convertFile
+            manifest.remove(filename)
+            todo.append((filename, oldPrefix))
+    else:
+        todo = sources
+
+    try:
+        for filename, status, result in convertFiles(todo, args.output_dir,
+                jobs = jobs, mode = args.mode, exists = args.exists,
+                frameJobs = args.frame_jobs, stats = args.stats,
+                thumbnails = args.thumbnails, thumbFactor = args.thumb_factor,
+                fsync = args.fsync, compression = compression,
+                onTiming = printTiming if args.timing else None):
+            counts[status] += 1
+            if status == FAILED:
+                print(status, filename, result, sep = "\t", file = sys.stderr)
+                continue
+            print(status, filename, ",".join(result), sep = "\t")
+            if manifest is not None and status == CONVERTED and filename in states:
+                manifest.add(filename, states[filename], result, mode = args.mode,
+                        options = options)
+                if counts[CONVERTED] % 100 == 0:
+                    manifest.flush()
+    finally:
+        if manifest is not None:
+            manifest.flush()
+    print("{count} files: {converted} converted, {skipped} skipped, {failed} failed"
+            .format(count = len(sources), converted = counts[CONVERTED],
+                skipped = counts[SKIPPED], failed = counts[FAILED]),
+            file = sys.stderr)
+    summary = compressionSummary(debug.STATS.snapshot())
+    if summary is not None:
+        print(summary, file = sys.stderr)
+    if args.timing:
+        print(debug.STATS.summary("batch"), file = sys.stderr)
+    return 1 if counts[FAILED] else 0
+
+if __name__ == '__main__':
+    # worker processes of a frozen (cx_Freeze) build run the worker, not the CLI
+    from multiprocessing import freeze_support
+    freeze_support()
+    sys.exit(main())
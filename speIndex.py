@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+"""
+Index .SPE archives by header fields, reading only the 4100 bytes header
+
+    speIndex.py -o index.sqlite|index.csv [-j N] [--fields a,b,..] FILE|DIR|GLOB ...
+
+No FITS header is built and the data is never touched, so hundreds of
+thousands of files can be catalogued and then queried, e.g.:
+
+    SELECT filename FROM spe_headers WHERE exp_sec > 10 AND date_iso >= '2017-01-01'
+"""
+
+import sys
+import os
+import csv
+import sqlite3
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from spe2fits import SPE
+from speBatch import expandSources
+
+DEFAULT_FIELDS = ('exp_sec', 'date', 'ExperimentTimeUTC', 'NumFrames',
+        'xdim', 'ydim', 'datatype', 'DetTemperature')
+TABLE = "spe_headers"
+
+_layouts = {} # {(fields, headerfile): SpeHeaderLayout}, per process
+
+def scanHeader(filename, fields = DEFAULT_FIELDS, headerfile = None):
+    """ return {"filename", "size", "mtime", <fields>..., "date_iso"}
+    only the header of filename is read
+    """
+    layout = _layouts.get((fields, headerfile))
+    if layout is None:
+        layout = SPE.getHeaderLayout(headerfile).select(fields)
+        _layouts[(fields, headerfile)] = layout
+    with open(filename, "rb") as fileObj:
+        headerData = fileObj.read(SPE.SPE_DATA_OFFSET)
+        stat = os.fstat(fileObj.fileno())
+    if len(headerData) < SPE.SPE_DATA_OFFSET:
+        raise ValueError("{}: incomplete .SPE header".format(filename))
+    row = { "filename": os.path.abspath(filename),
+            "size": stat.st_size, "mtime": stat.st_mtime }
+    for key, (val, comment) in layout.decode(headerData).items():
+        row[key] = val if not isinstance(val, bytes) else val.decode(errors = "replace")
+    if "date" in row:
+        row["date_iso"] = isoDate(row["date"])
+    return row
+
+def isoDate(date):
+    """ WinView 'ddmmmyyyy' to 'yyyy-mm-dd', None if not parsable
+    """
+    try:
+        return datetime.strptime(date, "%d%b%Y").date().isoformat()
+    except ValueError:
+        return None
+
+def _scanOne(args):
+    filename, fields, headerfile = args
+    try:
+        return scanHeader(filename, fields, headerfile)
+    except Exception as e:
+        print("FAIL", filename, e, sep = "\t", file = sys.stderr)
+        return None
+
+def scanHeaders(filenames, fields = DEFAULT_FIELDS, headerfile = None, jobs = 1):
+    """ yield `scanHeader` rows of filenames (unreadable ones are reported
+    and left out), in jobs processes
+    """
+    fields = tuple(fields)
+    tasks = ( (filename, fields, headerfile) for filename in filenames )
+    if jobs <= 1:
+        results = map(_scanOne, tasks)
+        yield from filter(None, results)
+        return
+    with ProcessPoolExecutor(max_workers = jobs) as executor:
+        yield from filter(None, executor.map(_scanOne, tasks, chunksize = 256))
+
+def fieldColumns(fields, headerfile = None):
+    """ column names of header keys fields, arrays expanded into one column
+    per element ( Comments -> Comments_0 .. Comments_4 ), see `decodedKeys`
+    raise ValueError for unknown keys, and for keys defined more than once
+    (e.g. pixel_position of x and y calibration) as their values collide
+    """
+    layout = SPE.getHeaderLayout(headerfile)
+    known = layout.keys
+    unknown = set(fields) - set(known)
+    if unknown:
+        raise ValueError("unknown header keys: {}".format(", ".join(sorted(unknown))))
+    ambiguous = set(key for key in fields if known.count(key) > 1)
+    if ambiguous:
+        raise ValueError("header keys defined more than once, can not be "
+                "indexed: {}".format(", ".join(sorted(ambiguous))))
+    return layout.decodedKeys(fields)
+
+def columns(fields):
+    columns = [ "filename", "size", "mtime" ] + list(fields)
+    if "date" in fields:
+        columns.append("date_iso")
+    return columns
+
+def writeCsv(rows, output, fields):
+    count = 0
+    with open(output, "w", newline = "") as fileObj:
+        writer = csv.DictWriter(fileObj, columns(fields), extrasaction = "ignore")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+def writeSqlite(rows, output, fields, batch = 1000):
+    """ insert or replace rows into table spe_headers, keyed by filename
+    columns missing from an existing table (indexed with other fields
+    before) are added, empty for the rows already there
+    """
+    names = columns(fields)
+    connection = sqlite3.connect(output)
+    try:
+        connection.execute("CREATE TABLE IF NOT EXISTS {table} ({columns}, "
+                "PRIMARY KEY (filename))".format(table = TABLE,
+                    columns = ", ".join('"{}"'.format(name) for name in names)))
+        existing = set(row[1] for row in connection.execute(
+            'PRAGMA table_info("{}")'.format(TABLE)))
+        for name in names:
+            if name not in existing:
+                connection.execute('ALTER TABLE {table} ADD COLUMN "{name}"'
+                        .format(table = TABLE, name = name))
+        for name in ("exp_sec", "date_iso", "NumFrames"):
+            if name in names:
+                connection.execute('CREATE INDEX IF NOT EXISTS "{table}_{name}" '
+                        'ON {table} ("{name}")'.format(table = TABLE, name = name))
+        insert = "INSERT OR REPLACE INTO {table} ({columns}) VALUES ({marks})".format(
+                table = TABLE,
+                columns = ", ".join('"{}"'.format(name) for name in names),
+                marks = ", ".join("?" * len(names)))
+        count = 0
+        pending = []
+        for row in rows:
+            pending.append([ row.get(name) for name in names ])
+            if len(pending) >= batch:
+                connection.executemany(insert, pending)
+                connection.commit()
+                count += len(pending)
+                pending = []
+        connection.executemany(insert, pending)
+        connection.commit()
+        return count + len(pending)
+    finally:
+        connection.close()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+            description = "Index .SPE files by header fields, reading headers only")
+    parser.add_argument("sources", nargs = "+", metavar = "FILE|DIR|GLOB",
+            help = ".SPE files, directories (searched recursively) or glob patterns")
+    parser.add_argument("-o", "--output", required = True,
+            help = "index file, SQLite unless it ends with .csv")
+    parser.add_argument("-j", "--jobs", type = int, default = 1,
+            help = "number of worker processes (0 for all cores)")
+    parser.add_argument("--fields", default = ",".join(DEFAULT_FIELDS),
+            help = "comma separated header keys, default %(default)s")
+    args = parser.parse_args(argv)
+
+    fields = tuple(field for field in args.fields.split(",") if field)
+    try:
+        names = fieldColumns(fields)
+    except ValueError as e:
+        parser.error(str(e))
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    filenames = ( filename for filename, oldPrefix in expandSources(args.sources) )
+    rows = scanHeaders(filenames, fields, jobs = jobs)
+    if args.output.lower().endswith(".csv"):
+        count = writeCsv(rows, args.output, names)
+    else:
+        count = writeSqlite(rows, args.output, names)
+    print(count, "files indexed into", args.output, file = sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    # worker processes of a frozen (cx_Freeze) build run the worker, not the CLI
+    from multiprocessing import freeze_support
+    freeze_support()
+    sys.exit(main())
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+"""
+Conversion manifest, stored in the output directory
+
+For every converted .SPE it records size, mtime, a hash of the 4100 bytes
+header, output mode and options and the FITS files produced with their
+sizes, so that a later run can skip sources which have not changed, were
+converted the same way and whose outputs are complete, without opening them.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+MANIFEST_NAME = ".spe2fits-manifest.json"
+
+def headerHash(filename):
+    """ sha1 of .SPE header
+    """
+    from spe2fits import SPE
+    with open(filename, "rb") as fileObj:
+        return hashlib.sha1(fileObj.read(SPE.SPE_DATA_OFFSET)).hexdigest()
+
+def conversionOptions(stats = False, compression = None, thumbnails = None,
+        thumbFactor = 4):
+    """ {option: value} of a conversion besides its mode, JSON serializable,
+    recorded per source, a source converted otherwise is not up to date
+    """
+    return { "stats": bool(stats),
+            "compression": repr(compression) if compression is not None else None,
+            "thumbnails": thumbnails,
+            "thumbFactor": thumbFactor if thumbnails is not None else None }
+
+def sourceState(filename, withHash = True):
+    """ {"size", "mtime"[, "header"]} of a source file
+    """
+    stat = os.stat(filename)
+    state = { "size": stat.st_size, "mtime": stat.st_mtime }
+    if withHash:
+        state["header"] = headerHash(filename)
+    return state
+
+class Manifest:
+    """ {source filename: {"size", "mtime", "header", "mode", "options", "outputs"}}
+    options: see `conversionOptions`
+    outputs: [[FITS filename, size], ...]
+    Thread-safe, changes are written by `flush` (atomically). Everything
+    in one process converting into the same directory should use the same
+    instance ( `shared` ), otherwise entries of one overwrite the other's.
+    """
+    _shared = {} # {manifest path: Manifest}, see `shared`
+    _sharedLock = threading.Lock()
+
+    @classmethod
+    def shared(cls, outputDir, name = MANIFEST_NAME):
+        """ the Manifest of outputDir in this process, loaded once
+        """
+        path = os.path.abspath(os.path.join(outputDir, name))
+        with cls._sharedLock:
+            manifest = cls._shared.get(path)
+            if manifest is None:
+                manifest = cls(outputDir, name)
+                cls._shared[path] = manifest
+            return manifest
+
+    def __init__(self, outputDir, name = MANIFEST_NAME):
+        """
+        outputDir: output directory the manifest is kept in
+        """
+        path = os.path.join(outputDir, name)
+        self._path = path
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(path) as fileObj:
+                self._entries = json.load(fileObj)
+        except FileNotFoundError:
+            self._entries = {}
+
+    @property
+    def path(self):
+        return self._path
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, filename):
+        with self._lock:
+            return self._entries.get(os.path.abspath(filename))
+
+    def isUpToDate(self, filename, mode = None, verifyHeader = False, options = None):
+        """ True if filename is unchanged since recorded (size, mtime, and
+        header hash if verifyHeader) with the same mode and options (default
+        `conversionOptions()`), and all its outputs still exist with the
+        recorded sizes (not partially written)
+        """
+        entry = self.get(filename)
+        if entry is None or (mode is not None and entry.get("mode") != mode):
+            return False
+        if options is None:
+            options = conversionOptions()
+        if entry.get("options", conversionOptions()) != options:
+            return False
+        try:
+            state = sourceState(filename, withHash = verifyHeader)
+        except OSError:
+            return False
+        if any(entry.get(key) != val for key, val in state.items()):
+            return False
+        for output, size in entry.get("outputs", ()):
+            try:
+                if os.stat(output).st_size != size:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def add(self, filename, state, outputs, mode = None, options = None):
+        """ record conversion of filename
+        state: `sourceState` of filename taken before it was converted
+        outputs: FITS files written
+        options: `conversionOptions` it was converted with, default none
+        """
+        if options is None:
+            options = conversionOptions()
+        entry = dict(state, mode = mode, options = options, outputs = [
+            [output, os.stat(output).st_size] for output in outputs ])
+        with self._lock:
+            self._entries[os.path.abspath(filename)] = entry
+            self._dirty = True
+
+    def remove(self, filename):
+        """ forget filename, e.g. before converting it again
+        """
+        with self._lock:
+            if self._entries.pop(os.path.abspath(filename), None) is not None:
+                self._dirty = True
+
+    def flush(self):
+        """ write manifest if changed, to temporary file then rename,
+        a crash never leaves half written manifest
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            # unique name, other processes may flush the same manifest
+            fd, tmpname = tempfile.mkstemp(prefix = os.path.basename(self._path),
+                    suffix = ".tmp", dir = os.path.dirname(self._path) or ".")
+            try:
+                with os.fdopen(fd, "w") as fileObj:
+                    json.dump(self._entries, fileObj, indent = 1, sort_keys = True)
+                os.replace(tmpname, self._path)
+            except BaseException:
+                os.unlink(tmpname)
+                raise
+            self._dirty = False
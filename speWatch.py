@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+
+"""
+Watch directories for .SPE files, dispatch them once completely written
+
+WinView creates the .SPE first and fills it afterwards, so a file is only
+handed over when its size has been stable for a while (or it has been
+closed) and holds all frames given by its own header.
+
+Run as headless service (no display needed):
+    speWatch.py SRCDIR -o OUTDIR [-j N] [--mode frames|cube|extensions]
+Follow one .SPE still being acquired, converting only its new frames:
+    speWatch.py FILE.SPE -o OUTDIR [--mode frames|cube] [--interval SEC]
+"""
+
+import sys
+import os
+import re
+import time
+import signal
+import argparse
+import threading
+from functools import partial
+from warnings import warn
+
+# ref: https://github.com/gorakhargosh/watchdog
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+
+import debug
+from spe2fits import SPE
+from speBatch import convertFileTimed, expandSources, getOutputPrefix, FAILED
+from speManifest import Manifest, sourceState, conversionOptions
+
+class SettledFileHandler(FileSystemEventHandler):
+    """ watchdog handler calling hook(filename) for complete .SPE files
+    Events of one file are coalesced, hook is called once per completed
+    write, from the checker thread.
+    """
+    SPE_FILE_PATTERN = re.compile(r".*\.spe$", re.IGNORECASE)
+
+    def __init__(self, hook = None, settle = 1.0, poll = 0.2, staleTimeout = 300):
+        """
+        settle: seconds size must stay unchanged if no close event is seen
+        poll: seconds between checks, bounds latency after file is complete
+        staleTimeout: seconds after which an incomplete, unchanged file is dropped
+        """
+        self._hook = hook
+        self._settle = settle
+        self._poll = poll
+        self._staleTimeout = staleTimeout
+        self._pending = {} # {filename: [size, changed time, closed]}
+        self._dispatched = {} # {filename: (size, mtime) when last dispatched}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._checker = threading.Thread(target = self._check_loop,
+                name = "SettledFileHandler", daemon = True)
+        self._checker.start()
+
+    def set_hook(self, hook):
+        self._hook = hook
+
+    def stop(self):
+        self._stop_event.set()
+        self._checker.join()
+
+    @property
+    def pending(self):
+        """ files seen but not dispatched yet
+        """
+        with self._lock:
+            return list(self._pending)
+
+    def track(self, filename, closed = False):
+        """ (re)start watching filename, e.g. for files existing before watching
+        ignored if it is unchanged since dispatched, e.g. closed afterwards
+        """
+        filename = os.path.abspath(filename)
+        if not SettledFileHandler.SPE_FILE_PATTERN.match(filename):
+            return
+        try:
+            stat = os.stat(filename)
+            current = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            current = None
+        with self._lock:
+            if filename not in self._pending and current is not None \
+                    and self._dispatched.get(filename) == current:
+                return
+            state = self._pending.setdefault(filename, [-1, time.monotonic(), False])
+            state[2] = state[2] or closed
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.track(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.track(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.track(event.dest_path)
+
+    def on_closed(self, event):
+        if not event.is_directory:
+            self.track(event.src_path, closed = True)
+
+    def _check_loop(self):
+        while not self._stop_event.wait(self._poll):
+            for filename in self._settled():
+                try:
+                    self._hook(filename)
+                except Exception as e:
+                    warn("process {} failed: {}".format(filename, e))
+
+    def _settled(self):
+        """ pop and return files which are completely written
+        """
+        now = time.monotonic()
+        settled = []
+        with self._lock:
+            for filename, state in list(self._pending.items()):
+                try:
+                    stat = os.stat(filename)
+                except OSError: # removed
+                    self._pending.pop(filename)
+                    self._dispatched.pop(filename, None)
+                    continue
+                size = stat.st_size
+                if size != state[0]:
+                    state[0], state[1] = size, now
+                    if not state[2]:
+                        continue
+                elif not state[2] and now - state[1] < self._settle:
+                    continue
+                try:
+                    expected = SPE.expectedFileSize(filename)
+                except (OSError, ValueError):
+                    expected = None
+                # LightField (SPE 3.0) appends an XML footer after the frames
+                if expected is not None and size >= expected:
+                    self._pending.pop(filename)
+                    self._dispatched[filename] = (size, stat.st_mtime_ns)
+                    settled.append(filename)
+                elif now - state[1] > self._staleTimeout:
+                    warn("{} stays incomplete ({} of {} bytes), dropped"
+                            .format(filename, size, expected))
+                    self._pending.pop(filename)
+                else:
+                    state[2] = False # wait for it to be written and closed again
+        return settled
+
+class WatchService:
+    """ Convert .SPE appearing under srcDir into outputDir, without GUI
+    Files already there are caught up at start, files recorded in the
+    manifest of outputDir as converted (and unchanged) are skipped.
+    """
+    FLUSH_EVERY = 100 # conversions between manifest rewrites, while busy
+
+    def __init__(self, srcDir, outputDir, jobs = 1, settle = 1.0,
+            mode = "frames", **convertArgs):
+        from concurrent.futures import ProcessPoolExecutor
+        from bufferPool import POOL, setBudget
+        self._srcDir = os.path.abspath(srcDir)
+        self._outputDir = os.path.abspath(outputDir)
+        self._mode = mode
+        self._convertArgs = dict(convertArgs, mode = mode)
+        self._options = conversionOptions(convertArgs.get("stats", False),
+                convertArgs.get("compression"), convertArgs.get("thumbnails"),
+                convertArgs.get("thumbFactor", 4))
+        self._manifest = Manifest.shared(self._outputDir)
+        self._executor = ProcessPoolExecutor(max_workers = jobs,
+                initializer = setBudget, initargs = (POOL.budget // jobs,))
+        self._inflight = {} # {filename: dispatched again while converting}
+        self._unflushed = 0 # conversions not flushed to manifest yet
+        self._lock = threading.Lock()
+        self._handler = SettledFileHandler(self.dispatch, settle = settle)
+        self._observer = Observer()
+
+    def start(self, catchUp = True):
+        self._observer.schedule(self._handler, self._srcDir, recursive = True)
+        self._observer.start()
+        if catchUp:
+            for filename, oldPrefix in expandSources([self._srcDir]):
+                if not self._manifest.isUpToDate(filename, self._mode,
+                        options = self._options):
+                    self._handler.track(filename, closed = True)
+
+    def stop(self):
+        if self._observer.is_alive():
+            self._observer.stop()
+            self._observer.join()
+        self._handler.stop()
+        self._executor.shutdown(wait = True)
+        self._manifest.flush()
+
+    def dispatch(self, filename):
+        """ hook of SettledFileHandler, convert filename in a worker process
+        """
+        with self._lock:
+            if filename in self._inflight:
+                self._inflight[filename] = True
+                return
+            if self._manifest.isUpToDate(filename, self._mode, options = self._options):
+                return # e.g. a late event of a file converted already
+            self._inflight[filename] = False
+        try:
+            state = sourceState(filename)
+        except OSError as e:
+            with self._lock:
+                self._inflight.pop(filename, None)
+            print(FAILED, filename, e, sep = "\t", file = sys.stderr, flush = True)
+            return
+        self._manifest.remove(filename)
+        future = self._executor.submit(convertFileTimed, filename, self._outputDir,
+                self._srcDir, **self._convertArgs)
+        future.add_done_callback(partial(self._converted, filename, state))
+
+    def _converted(self, filename, state, future):
+        try:
+            (filename, status, result), timing = future.result()
+        except Exception as e: # worker died
+            status, result, timing = FAILED, e, {}
+        debug.merge(timing)
+        if status == FAILED:
+            print(status, filename, result, sep = "\t", file = sys.stderr, flush = True)
+        else:
+            self._manifest.add(filename, state, result, mode = self._mode,
+                    options = self._options)
+            print(status, filename, ",".join(result), sep = "\t", flush = True)
+        with self._lock:
+            again = self._inflight.pop(filename, False)
+            self._unflushed += 1
+            # one rewrite per FLUSH_EVERY files while catching up, not per file
+            flush = not self._inflight or self._unflushed >= WatchService.FLUSH_EVERY
+            if flush:
+                self._unflushed = 0
+        if flush:
+            self._manifest.flush()
+        if again:
+            self._handler.track(filename)
+
+def followFile(filename, outputDir, stop_event, mode = "frames", interval = 1.0,
+        output_verify = "warn"):
+    """ convert frames of a growing .SPE as they are written, until stop_event
+    mode: "frames" (new FITS per frame) or "cube" (appended to one cube)
+    """
+    speHandler = SPE(filename)
+    outPrefix = getOutputPrefix(filename, outputDir, None)
+    try:
+        while True:
+            new = speHandler.followToFits(mode, outPrefix,
+                    output_verify = output_verify)
+            if len(new) > 0:
+                print("frames", new.start, "to", new.stop - 1, "of", filename, flush = True)
+            if stop_event.wait(interval):
+                break
+    finally:
+        speHandler.close()
+
+def printTiming(title):
+    """ print timing recorded since last call, if any, see `debug.STATS`
+    """
+    timing = debug.STATS.reset()
+    if timing:
+        print(debug.formatStats(timing, title), file = sys.stderr, flush = True)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+            description = "Watch a directory and convert new .SPE files to FITS, "
+            "or follow one growing .SPE and convert its new frames")
+    parser.add_argument("source", help = "directory to watch (recursively), "
+            "or .SPE file to follow")
+    parser.add_argument("-o", "--output-dir", required = True,
+            help = "output directory, relative layout of source is kept")
+    parser.add_argument("-j", "--jobs", type = int, default = 1,
+            help = "number of worker processes (0 for all cores)")
+    parser.add_argument("--mode", default = "frames",
+            choices = ("frames", "cube", "extensions"),
+            help = "one FITS per frame, one 3-D cube, or one extension per frame")
+    parser.add_argument("--settle", type = float, default = 1.0,
+            help = "seconds a file must stay unchanged before conversion")
+    parser.add_argument("--no-catch-up", action = "store_true",
+            help = "do not convert files which exist before watching")
+    parser.add_argument("--interval", type = float, default = 1.0,
+            help = "seconds between checks of a followed file")
+    parser.add_argument("--timing-interval", type = float, default = 300,
+            help = "seconds between summaries of time spent per stage, 0 for never")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok = True)
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    if args.timing_interval > 0:
+        def timingLoop():
+            while not stop_event.wait(args.timing_interval):
+                printTiming("timing")
+        threading.Thread(target = timingLoop, name = "timing", daemon = True).start()
+    if os.path.isfile(args.source):
+        if args.mode == "extensions":
+            parser.error("a followed file can only be converted to frames or cube")
+        print("following", os.path.abspath(args.source), flush = True)
+        try:
+            followFile(args.source, args.output_dir, stop_event,
+                    mode = args.mode, interval = args.interval)
+        except KeyboardInterrupt:
+            pass
+        printTiming("timing")
+        return 0
+
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    service = WatchService(args.source, args.output_dir, jobs = jobs,
+            settle = args.settle, mode = args.mode)
+    service.start(catchUp = not args.no_catch_up)
+    print("watching", os.path.abspath(args.source), flush = True)
+    try:
+        while not stop_event.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        printTiming("timing")
+    return 0
+
+if __name__ == '__main__':
+    # worker processes of a frozen (cx_Freeze) build run the worker, not the CLI
+    from multiprocessing import freeze_support
+    freeze_support()
+    sys.exit(main())
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def makeSpe(tmp_path):
+    """ makeSpe(frames, ydim, xdim, datatype = 3, name = "a.SPE") -> path
+    of a synthetic noisy .SPE (see `benchmark.makeSpe`)
+    """
+    from benchmark import makeSpe as make
+    def factory(frames, ydim, xdim, datatype = 3, name = "a.SPE"):
+        filename = str(tmp_path / name)
+        make(filename, frames, ydim, xdim, datatype)
+        return filename
+    return factory
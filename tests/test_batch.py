@@ -0,0 +1,41 @@
+import os
+import multiprocessing
+
+import pytest
+
+import speBatch
+from speBatch import convertFile, convertFiles, CONVERTED, SKIPPED, FAILED
+
+def test_skip_completes_partial_output(makeSpe, tmp_path):
+    filename = makeSpe(4, 8, 6)
+    outputDir = str(tmp_path / "out")
+    name, status, outputs = convertFile(filename, outputDir, output_verify = "ignore")
+    assert status == CONVERTED and len(outputs) == 4
+    os.remove(outputs[2])
+    mtime = os.path.getmtime(outputs[0])
+    name, status, outputs = convertFile(filename, outputDir, exists = "skip",
+            output_verify = "ignore")
+    assert status == CONVERTED, outputs
+    assert all(map(os.path.exists, outputs))
+    assert os.path.getmtime(outputs[0]) == mtime
+    assert convertFile(filename, outputDir, exists = "skip")[1] == SKIPPED
+
+def _crashing(filename, *args, **kwargs):
+    if filename.endswith("crash.SPE"):
+        os._exit(134)
+    return _convertFile(filename, *args, **kwargs)
+
+_convertFile = speBatch._convertFile
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+        reason = "the patched worker reaches children only by fork")
+def test_crashed_worker_reported(makeSpe, tmp_path, monkeypatch):
+    sources = [ (makeSpe(2, 4, 4, name = name), None)
+            for name in ("a.SPE", "crash.SPE", "b.SPE") ]
+    monkeypatch.setattr(speBatch, "_convertFile", _crashing)
+    results = list(convertFiles(sources, str(tmp_path / "out"), jobs = 2,
+        output_verify = "ignore"))
+    assert sorted(name for name, status, result in results) == \
+            sorted(name for name, prefix in sources)
+    statuses = { os.path.basename(name): status for name, status, result in results }
+    assert statuses["crash.SPE"] == FAILED
@@ -0,0 +1,37 @@
+import subprocess
+import sys
+import os
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from fitsWriter import Compression, COMPRESSION_TYPES
+from spe2fits import SPE
+
+def test_plio_rejected():
+    assert "PLIO_1" not in COMPRESSION_TYPES.values()
+    with pytest.raises(ValueError):
+        Compression("plio")
+
+@pytest.mark.parametrize("type_", sorted(COMPRESSION_TYPES))
+def test_noisy_int16_lossless(makeSpe, tmp_path, type_):
+    """ noisy signed 16 bits frames, the case PLIO_1 aborted on
+    run in a child process, so a crash in astropy fails the test only
+    """
+    filename = makeSpe(3, 64, 48, datatype = 2)
+    outPrefix = str(tmp_path / "out")
+    code = ("import sys; sys.path.insert(0, {root!r}); from spe2fits import SPE; "
+            "SPE({name!r}).spe2fits(mode = 'cube', outPrefix = {out!r}, "
+            "output_verify = 'ignore', compression = {type_!r})").format(
+                    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    name = filename, out = outPrefix, type_ = type_)
+    result = subprocess.run([sys.executable, "-c", code], capture_output = True)
+    assert result.returncode == 0, result.stderr.decode()
+    with fits.open(outPrefix + ".fits") as hdus:
+        assert np.array_equal(hdus[1].data, SPE(filename).readFrames(None))
+
+def test_cli_rejects_plio(tmp_path):
+    from speBatch import main
+    with pytest.raises(SystemExit):
+        main(["--compress", "plio", "-o", str(tmp_path), str(tmp_path)])
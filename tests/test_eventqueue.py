@@ -0,0 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from eventQueue import EventQueue
+
+def test_finishes_when_submit_fails():
+    """ the queue's future resolves even if the executor refuses children """
+    executor = ThreadPoolExecutor(max_workers = 1)
+    executor.shutdown()
+    queue = EventQueue(children = range(3), executor = executor)
+    queue.startEvents()
+    assert queue.future.result(timeout = 10) == 0
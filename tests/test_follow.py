@@ -0,0 +1,38 @@
+import os
+import struct
+
+import numpy as np
+from astropy.io import fits
+
+from spe2fits import SPE
+
+NUMFRAMES_OFFSET = 1446
+
+def setNumFrames(filename, count):
+    with open(filename, "r+b") as fileObj:
+        fileObj.seek(NUMFRAMES_OFFSET)
+        fileObj.write(struct.pack("<i", count))
+
+def test_follow_cube(makeSpe, tmp_path):
+    """ appended cube matches the .SPE, NUMFRAMES follows the header,
+    a cube removed meanwhile is written again from frame 0 """
+    filename = makeSpe(6, 4, 3)
+    outPrefix = str(tmp_path / "cube")
+    setNumFrames(filename, 2)
+    speHandler = SPE(filename)
+    try:
+        assert speHandler.followToFits("cube", outPrefix) == range(0, 2)
+        setNumFrames(filename, 4)
+        assert speHandler.followToFits("cube", outPrefix) == range(2, 4)
+        with fits.open(outPrefix + ".fits") as hdus:
+            assert hdus[0].header['NUMFRAMES'] == 4
+            assert np.array_equal(hdus[0].data, speHandler.readFrames(range(4)))
+        os.remove(outPrefix + ".fits")
+        setNumFrames(filename, 6)
+        assert speHandler.followToFits("cube", outPrefix) == range(4, 6)
+        with fits.open(outPrefix + ".fits") as hdus:
+            assert hdus[0].header['FRAME0'] == 0
+            assert hdus[0].header['NUMFRAMES'] == 6
+            assert np.array_equal(hdus[0].data, speHandler.readFrames(range(6)))
+    finally:
+        speHandler.close()
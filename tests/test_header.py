@@ -0,0 +1,10 @@
+import pytest
+
+from spe2fits import SPE
+
+def test_truncated_header(tmp_path):
+    filename = str(tmp_path / "t.SPE")
+    with open(filename, "wb") as fileObj:
+        fileObj.write(b'\x00' * 1000)
+    with pytest.raises(ValueError, match = "incomplete .SPE header"):
+        SPE(filename)
@@ -0,0 +1,37 @@
+import csv
+
+import pytest
+
+import speIndex
+
+def test_array_keys_expanded(makeSpe, tmp_path):
+    """ array keys give one indexed column per element """
+    filename = makeSpe(2, 4, 4)
+    output = str(tmp_path / "index.csv")
+    assert speIndex.main([ "-o", output, "--fields", "xdim,SpecSlitPos", filename ]) == 0
+    with open(output) as fileObj:
+        rows = list(csv.DictReader(fileObj))
+    assert len(rows) == 1
+    assert rows[0]["xdim"] == "4"
+    assert [ name for name in rows[0] if name.startswith("SpecSlitPos") ] == \
+            [ "SpecSlitPos_{}".format(i) for i in range(4) ]
+    assert all(rows[0]["SpecSlitPos_{}".format(i)] != "" for i in range(4))
+
+def test_duplicate_keys_rejected(makeSpe, tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        speIndex.main([ "-o", str(tmp_path / "index.csv"),
+            "--fields", "pixel_position", makeSpe(1, 4, 4) ])
+    assert "pixel_position" in capsys.readouterr().err
+
+def test_reindex_with_other_fields(makeSpe, tmp_path):
+    import sqlite3
+    filename = makeSpe(2, 4, 4)
+    output = str(tmp_path / "index.sqlite")
+    assert speIndex.main([ "-o", output, "--fields", "xdim", filename ]) == 0
+    assert speIndex.main([ "-o", output, "--fields", "xdim,ydim,exp_sec", filename ]) == 0
+    connection = sqlite3.connect(output)
+    try:
+        rows = connection.execute("SELECT xdim, ydim, exp_sec FROM spe_headers").fetchall()
+    finally:
+        connection.close()
+    assert rows == [ (4, 4, 1.0) ]
@@ -0,0 +1,21 @@
+import os
+
+from speManifest import Manifest, sourceState, conversionOptions
+
+def test_shared_per_directory(tmp_path):
+    assert Manifest.shared(str(tmp_path)) is Manifest.shared(str(tmp_path) + "/.")
+    assert Manifest.shared(str(tmp_path)) is not Manifest.shared(str(tmp_path / "x"))
+
+def test_options_change_is_not_up_to_date(makeSpe, tmp_path):
+    filename = makeSpe(1, 4, 4)
+    output = str(tmp_path / "out.fits")
+    open(output, "wb").close()
+    manifest = Manifest(str(tmp_path))
+    manifest.add(filename, sourceState(filename), [output], mode = "cube")
+    assert manifest.isUpToDate(filename, "cube")
+    assert not manifest.isUpToDate(filename, "cube", options = conversionOptions(stats = True))
+    assert not manifest.isUpToDate(filename, "cube",
+            options = conversionOptions(compression = "rice"))
+    manifest.flush()
+    assert Manifest(str(tmp_path)).isUpToDate(filename, "cube")
+    assert [ name for name in os.listdir(str(tmp_path)) if name.endswith(".tmp") ] == []
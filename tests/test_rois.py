@@ -0,0 +1,37 @@
+import numpy as np
+
+from spe2fits import SPE
+
+def writeRoiSpe(filename, rois, ydim, xdim, frames = 2):
+    header = bytearray(SPE.getHeaderLayout().encode({ 'xdim': xdim, 'ydim': ydim,
+        'NumFrames': frames, 'datatype': 3, 'NumROI': len(rois) }))
+    block = np.array(rois, dtype = SPE.ROI_DTYPE).tobytes()
+    header[SPE.ROI_OFFSET:SPE.ROI_OFFSET + len(block)] = block
+    data = np.arange(frames * ydim * xdim, dtype = '<u2')
+    with open(filename, "wb") as fileObj:
+        fileObj.write(header)
+        fileObj.write(data.tobytes())
+    return data.reshape(frames, ydim * xdim)
+
+def test_rois_from_header(tmp_path):
+    """ ROIinfoblk is decoded with the header, frames split into its ROIs """
+    filename = str(tmp_path / "r.SPE")
+    data = writeRoiSpe(filename, [ (0, 9, 1, 0, 3, 1), (0, 4, 1, 0, 1, 1) ], 1, 50)
+    speHandler = SPE(filename)
+    try:
+        assert speHandler.roiShapes == [ (4, 10), (2, 5) ]
+        first, second = speHandler.splitRois(speHandler.readFrames())
+        assert np.array_equal(first.reshape(2, -1), data[:, :40])
+        assert np.array_equal(second.reshape(2, -1), data[:, 40:])
+    finally:
+        speHandler.close()
+
+def test_rois_not_making_up_frame(tmp_path, capsys):
+    filename = str(tmp_path / "w.SPE")
+    writeRoiSpe(filename, [ (0, 9, 1, 0, 3, 1), (0, 4, 1, 0, 0, 1) ], 1, 50)
+    speHandler = SPE(filename)
+    try:
+        assert speHandler.roiShapes == [ (1, 50) ]
+    finally:
+        speHandler.close()
+    assert capsys.readouterr().out.startswith("Warning:")
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from spe2fits import SPE
+
+SELECTIONS = [ slice(None, None, -1), slice(None, None, -2), slice(4, None, -1),
+        slice(6, 0, -3), [5, 0, 3] ]
+
+@pytest.mark.parametrize("frames", SELECTIONS, ids = str)
+def test_reversed_selection(makeSpe, frames):
+    """ descending selections ending at frame 0 are not empty """
+    speHandler = SPE(makeSpe(7, 5, 4, datatype = 3), mmap = True)
+    try:
+        index = list(speHandler.frameIndex(frames))
+        expected = speHandler.imgData[index]
+        blocks = [ block for part, block in speHandler.iterBlocks(frames) ]
+        assert np.array_equal(np.concatenate(blocks), expected)
+        assert np.array_equal(speHandler.readFrames(frames), expected)
+        assert np.array_equal(speHandler.mappedFrames(frames), expected)
+        stats = speHandler.frameStats(frames)
+        assert list(stats['frame']) == index
+        assert np.array_equal(stats['max'], expected.max(axis = (1, 2)))
+    finally:
+        speHandler.close()
+
+@pytest.mark.parametrize("mode", [ "frames", "cube", "extensions" ])
+def test_out_of_range_selection_writes_nothing(makeSpe, tmp_path, mode):
+    speHandler = SPE(makeSpe(3, 4, 4))
+    try:
+        with pytest.raises(IndexError):
+            speHandler.spe2fits(mode, [ 0, 5 ], outPrefix = str(tmp_path / "out"))
+    finally:
+        speHandler.close()
+    assert not list(tmp_path.glob("out*"))
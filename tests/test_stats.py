@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from spe2fits import SPE
+from quickLook import combineStats
+
+@pytest.mark.parametrize("jobs, depth", [ (1, 2), (1, 0), (2, 2) ])
+def test_cube_stats_while_writing(makeSpe, tmp_path, monkeypatch, jobs, depth):
+    """ cube statistics are gathered from the frames written, no extra pass """
+    speHandler = SPE(makeSpe(6, 8, 5), mmap = True)
+    try:
+        expected = combineStats(speHandler.frameStats(median = False))
+        monkeypatch.setattr(SPE, "frameStats", None)
+        outPrefix = str(tmp_path / "cube")
+        speHandler.writeToFitsCube(outPrefix = outPrefix, jobs = jobs,
+                depth = depth, stats = True)
+        speHandler.writeToFitsCube(outPrefix = outPrefix + "_ext", jobs = jobs,
+                depth = depth, stats = True, extensions = True)
+    finally:
+        speHandler.close()
+    with fits.open(outPrefix + ".fits") as hdus:
+        header = hdus[0].header
+        assert header['DATAMIN'] == expected['min']
+        assert header['DATAMAX'] == expected['max']
+        assert header['DATAMEAN'] == pytest.approx(expected['mean'])
+        assert header['NSATURAT'] == expected['nsat']
+        assert 'DATAMED' not in header
+    with fits.open(outPrefix + "_ext.fits") as hdus:
+        for hdu in hdus[1:]:
+            assert hdu.header['DATAMAX'] == hdu.data.max()
+            assert hdu.header['DATAMED'] == np.median(hdu.data)
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+pytest.importorskip("watchdog")
+
+from speWatch import SettledFileHandler
+
+def test_closed_after_dispatch_not_dispatched_again(makeSpe):
+    filename = makeSpe(2, 4, 4)
+    handler = SettledFileHandler(poll = 3600) # checked by hand below
+    try:
+        handler.track(filename, closed = True)
+        assert handler._settled() == [ os.path.abspath(filename) ]
+        handler.track(filename, closed = True) # e.g. closed by a reader
+        assert handler.pending == []
+        assert handler._settled() == []
+        stat = os.stat(filename)
+        os.utime(filename, ns = (stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9)) # rewritten
+        handler.track(filename, closed = True)
+        assert handler._settled() == [ os.path.abspath(filename) ]
+    finally:
+        handler.stop()
+
+def test_footer_after_frames_dispatched(makeSpe):
+    """ LightField (SPE 3.0) files end with an XML footer after the frames """
+    filename = makeSpe(2, 4, 4, datatype = 5)
+    with open(filename, "ab") as fileObj:
+        fileObj.write(b'<?xml version="1.0" encoding="utf-8"?><SpeFormat/>')
+    handler = SettledFileHandler(poll = 3600)
+    try:
+        handler.track(filename, closed = True)
+        assert handler._settled() == [ os.path.abspath(filename) ]
+    finally:
+        handler.stop()
+
+def test_incomplete_not_dispatched(makeSpe):
+    filename = makeSpe(2, 4, 4)
+    with open(filename, "r+b") as fileObj:
+        fileObj.truncate(os.path.getsize(filename) - 1)
+    handler = SettledFileHandler(poll = 3600)
+    try:
+        handler.track(filename, closed = True)
+        assert handler._settled() == []
+        assert handler.pending == [ os.path.abspath(filename) ]
+    finally:
+        handler.stop()
+
+def test_service_skips_up_to_date(makeSpe, tmp_path):
+    import time
+    from speWatch import WatchService
+    filename = os.path.abspath(makeSpe(2, 4, 4))
+    service = WatchService(os.path.dirname(filename), str(tmp_path / "out"),
+            output_verify = "ignore")
+    try:
+        service.dispatch(filename)
+        deadline = time.monotonic() + 60
+        while service._inflight and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert service._manifest.isUpToDate(filename, "frames")
+        service.dispatch(filename) # duplicate event
+        assert service._inflight == {}
+    finally:
+        service.stop()
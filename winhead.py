@@ -0,0 +1,194 @@
+# Generated by extractHeaderDesc.py from WINHEAD.TXT, do not edit
+# Regenerate: python3 extractHeaderDesc.py WINHEAD.TXT winhead.py
+
+SOURCE = 'WINHEAD.TXT'
+
+# keys: 'offset', 'type', 'key', 'comment'
+HEADERS = [
+    {'offset': 0, 'type': 'short', 'key': 'ControllerVersion', 'comment': 'Hardware Version'},
+    {'offset': 2, 'type': 'short', 'key': 'LogicOutput', 'comment': 'Definition of Output BNC'},
+    {'offset': 4, 'type': 'WORD', 'key': 'AmpHiCapLowNoise', 'comment': 'Amp Switching Mode'},
+    {'offset': 6, 'type': 'WORD', 'key': 'xDimDet', 'comment': 'Detector x dimension of chip.'},
+    {'offset': 8, 'type': 'short', 'key': 'mode', 'comment': 'timing mode'},
+    {'offset': 10, 'type': 'float', 'key': 'exp_sec', 'comment': 'alternitive exposure, in sec.'},
+    {'offset': 14, 'type': 'short', 'key': 'VChipXdim', 'comment': 'Virtual Chip X dim'},
+    {'offset': 16, 'type': 'short', 'key': 'VChipYdim', 'comment': 'Virtual Chip Y dim'},
+    {'offset': 18, 'type': 'WORD', 'key': 'yDimDet', 'comment': 'y dimension of CCD or detector.'},
+    {'offset': 20, 'type': 'char', 'key': 'date[DATEMAX]', 'comment': 'date'},
+    {'offset': 30, 'type': 'short', 'key': 'VirtualChipFlag', 'comment': 'On/Off'},
+    {'offset': 32, 'type': 'char', 'key': 'Spare_1[2]', 'comment': ''},
+    {'offset': 34, 'type': 'short', 'key': 'noscan', 'comment': 'Old number of scans - should always be -1'},
+    {'offset': 36, 'type': 'float', 'key': 'DetTemperature', 'comment': 'Detector Temperature Set'},
+    {'offset': 40, 'type': 'short', 'key': 'DetType', 'comment': 'CCD/DiodeArray type'},
+    {'offset': 42, 'type': 'WORD', 'key': 'xdim', 'comment': 'actual # of pixels on x axis'},
+    {'offset': 44, 'type': 'short', 'key': 'stdiode', 'comment': 'trigger diode'},
+    {'offset': 46, 'type': 'float', 'key': 'DelayTime', 'comment': 'Used with Async Mode'},
+    {'offset': 50, 'type': 'WORD', 'key': 'ShutterControl', 'comment': 'Normal, Disabled Open, Disabled Closed'},
+    {'offset': 52, 'type': 'short', 'key': 'AbsorbLive', 'comment': 'On/Off'},
+    {'offset': 54, 'type': 'WORD', 'key': 'AbsorbMode', 'comment': 'Reference Strip or File'},
+    {'offset': 56, 'type': 'short', 'key': 'CanDoVirtualChipFlag', 'comment': 'T/F Cont/Chip able to do Virtual Chip'},
+    {'offset': 58, 'type': 'short', 'key': 'ThresholdMinLive', 'comment': 'On/Off'},
+    {'offset': 60, 'type': 'float', 'key': 'ThresholdMinVal', 'comment': 'Threshold Minimum Value'},
+    {'offset': 64, 'type': 'short', 'key': 'ThresholdMaxLive', 'comment': 'On/Off'},
+    {'offset': 66, 'type': 'float', 'key': 'ThresholdMaxVal', 'comment': 'Threshold Maximum Value'},
+    {'offset': 70, 'type': 'short', 'key': 'SpecAutoSpectroMode', 'comment': 'T/F Spectrograph Used'},
+    {'offset': 72, 'type': 'float', 'key': 'SpecCenterWlNm', 'comment': 'Center Wavelength in Nm'},
+    {'offset': 76, 'type': 'short', 'key': 'SpecGlueFlag', 'comment': 'T/F File is Glued'},
+    {'offset': 78, 'type': 'float', 'key': 'SpecGlueStartWlNm', 'comment': 'Starting Wavelength in Nm'},
+    {'offset': 82, 'type': 'float', 'key': 'SpecGlueEndWlNm', 'comment': 'Starting Wavelength in Nm'},
+    {'offset': 86, 'type': 'float', 'key': 'SpecGlueMinOvrlpNm', 'comment': 'Minimum Overlap in Nm'},
+    {'offset': 90, 'type': 'float', 'key': 'SpecGlueFinalResNm', 'comment': 'Final Resolution in Nm'},
+    {'offset': 94, 'type': 'short', 'key': 'PulserType', 'comment': '0=None, PG200=1, PTG=2, DG535=3'},
+    {'offset': 96, 'type': 'short', 'key': 'CustomChipFlag', 'comment': 'T/F Custom Chip Used'},
+    {'offset': 98, 'type': 'short', 'key': 'XPrePixels', 'comment': 'Pre Pixels in X direction'},
+    {'offset': 100, 'type': 'short', 'key': 'XPostPixels', 'comment': 'Post Pixels in X direction'},
+    {'offset': 102, 'type': 'short', 'key': 'YPrePixels', 'comment': 'Pre Pixels in Y direction'},
+    {'offset': 104, 'type': 'short', 'key': 'YPostPixels', 'comment': 'Post Pixels in Y direction'},
+    {'offset': 106, 'type': 'short', 'key': 'asynen', 'comment': 'asynchron enable flag  0 = off'},
+    {'offset': 108, 'type': 'short', 'key': 'datatype', 'comment': 'experiment datatype'},
+    {'offset': 110, 'type': 'short', 'key': 'PulserMode', 'comment': 'Repetitive/Sequential'},
+    {'offset': 112, 'type': 'WORD', 'key': 'PulserOnChipAccums', 'comment': 'Num PTG On-Chip Accums'},
+    {'offset': 114, 'type': 'DWORD', 'key': 'PulserRepeatExp', 'comment': 'Num Exp Repeats (Pulser SW Accum)'},
+    {'offset': 118, 'type': 'float', 'key': 'PulseRepWidth', 'comment': 'Width Value for Repetitive pulse (usec)'},
+    {'offset': 122, 'type': 'float', 'key': 'PulseRepDelay', 'comment': 'Width Value for Repetitive pulse (usec)'},
+    {'offset': 126, 'type': 'float', 'key': 'PulseSeqStartWidth', 'comment': 'Start Width for Sequential pulse (usec)'},
+    {'offset': 130, 'type': 'float', 'key': 'PulseSeqEndWidth', 'comment': 'End Width for Sequential pulse (usec)'},
+    {'offset': 134, 'type': 'float', 'key': 'PulseSeqStartDelay', 'comment': 'Start Delay for Sequential pulse (usec)'},
+    {'offset': 138, 'type': 'float', 'key': 'PulseSeqEndDelay', 'comment': 'End Delay for Sequential pulse (usec)'},
+    {'offset': 142, 'type': 'short', 'key': 'PulseSeqIncMode', 'comment': 'Increments: 1=Fixed, 2=Exponential'},
+    {'offset': 144, 'type': 'short', 'key': 'PImaxUsed', 'comment': 'PI-Max type controller flag'},
+    {'offset': 146, 'type': 'short', 'key': 'PImaxMode', 'comment': 'PI-Max mode'},
+    {'offset': 148, 'type': 'short', 'key': 'PImaxGain', 'comment': 'PI-Max Gain'},
+    {'offset': 150, 'type': 'short', 'key': 'BackGrndApplied', 'comment': '1 if background subtraction done'},
+    {'offset': 152, 'type': 'short', 'key': 'PImax2nsBrdUsed', 'comment': 'T/F PI-Max 2ns Board Used'},
+    {'offset': 154, 'type': 'WORD', 'key': 'minblk', 'comment': 'min. # of strips per skips'},
+    {'offset': 156, 'type': 'WORD', 'key': 'numminblk', 'comment': '# of min-blocks before geo skps'},
+    {'offset': 158, 'type': 'short', 'key': 'SpecMirrorLocation[2]', 'comment': 'Spectro Mirror Location, 0=Not Present'},
+    {'offset': 162, 'type': 'short', 'key': 'SpecSlitLocation[4]', 'comment': 'Spectro Slit Location, 0=Not Present'},
+    {'offset': 170, 'type': 'short', 'key': 'CustomTimingFlag', 'comment': 'T/F Custom Timing Used'},
+    {'offset': 172, 'type': 'char', 'key': 'ExperimentTimeLocal[TIMEMAX]', 'comment': 'Experiment Local Time as hhmmss\\0'},
+    {'offset': 179, 'type': 'char', 'key': 'ExperimentTimeUTC[TIMEMAX]', 'comment': 'Experiment UTC Time as hhmmss\\0'},
+    {'offset': 186, 'type': 'short', 'key': 'ExposUnits', 'comment': 'User Units for Exposure'},
+    {'offset': 188, 'type': 'WORD', 'key': 'ADCoffset', 'comment': 'ADC offset'},
+    {'offset': 190, 'type': 'WORD', 'key': 'ADCrate', 'comment': 'ADC rate'},
+    {'offset': 192, 'type': 'WORD', 'key': 'ADCtype', 'comment': 'ADC type'},
+    {'offset': 194, 'type': 'WORD', 'key': 'ADCresolution', 'comment': 'ADC resolution'},
+    {'offset': 196, 'type': 'WORD', 'key': 'ADCbitAdjust', 'comment': 'ADC bit adjust'},
+    {'offset': 198, 'type': 'WORD', 'key': 'gain', 'comment': 'gain'},
+    {'offset': 200, 'type': 'char', 'key': 'Comments[5][COMMENTMAX]', 'comment': 'File Comments'},
+    {'offset': 600, 'type': 'WORD', 'key': 'geometric', 'comment': 'geometric ops: rotate 0x01,'},
+    {'offset': 602, 'type': 'char', 'key': 'xlabel[LABELMAX]', 'comment': 'intensity display string'},
+    {'offset': 618, 'type': 'WORD', 'key': 'cleans', 'comment': 'cleans'},
+    {'offset': 620, 'type': 'WORD', 'key': 'NumSkpPerCln', 'comment': 'number of skips per clean.'},
+    {'offset': 622, 'type': 'short', 'key': 'SpecMirrorPos[2]', 'comment': 'Spectrograph Mirror Positions'},
+    {'offset': 626, 'type': 'float', 'key': 'SpecSlitPos[4]', 'comment': 'Spectrograph Slit Positions'},
+    {'offset': 642, 'type': 'short', 'key': 'AutoCleansActive', 'comment': 'T/F'},
+    {'offset': 644, 'type': 'short', 'key': 'UseContCleansInst', 'comment': 'T/F'},
+    {'offset': 646, 'type': 'short', 'key': 'AbsorbStripNum', 'comment': 'Absorbance Strip Number'},
+    {'offset': 648, 'type': 'short', 'key': 'SpecSlitPosUnits', 'comment': 'Spectrograph Slit Position Units'},
+    {'offset': 650, 'type': 'float', 'key': 'SpecGrooves', 'comment': 'Spectrograph Grating Grooves'},
+    {'offset': 654, 'type': 'short', 'key': 'srccmp', 'comment': 'number of source comp. diodes'},
+    {'offset': 656, 'type': 'WORD', 'key': 'ydim', 'comment': 'y dimension of raw data.'},
+    {'offset': 658, 'type': 'short', 'key': 'scramble', 'comment': '0=scrambled,1=unscrambled'},
+    {'offset': 660, 'type': 'short', 'key': 'ContinuousCleansFlag', 'comment': 'T/F Continuous Cleans Timing Option'},
+    {'offset': 662, 'type': 'short', 'key': 'ExternalTriggerFlag', 'comment': 'T/F External Trigger Timing Option'},
+    {'offset': 664, 'type': 'long', 'key': 'lnoscan', 'comment': 'Number of scans (Early WinX)'},
+    {'offset': 668, 'type': 'long', 'key': 'lavgexp', 'comment': 'Number of Accumulations'},
+    {'offset': 672, 'type': 'float', 'key': 'ReadoutTime', 'comment': 'Experiment readout time'},
+    {'offset': 676, 'type': 'short', 'key': 'TriggeredModeFlag', 'comment': 'T/F Triggered Timing Option'},
+    {'offset': 678, 'type': 'char', 'key': 'Spare_2[10]', 'comment': ''},
+    {'offset': 688, 'type': 'char', 'key': 'sw_version[FILEVERMAX]', 'comment': 'Version of SW creating this file'},
+    {'offset': 704, 'type': 'short', 'key': 'type', 'comment': '1 = new120 (Type II)'},
+    {'offset': 706, 'type': 'short', 'key': 'flatFieldApplied', 'comment': '1 if flat field was applied.'},
+    {'offset': 708, 'type': 'char', 'key': 'Spare_3[16]', 'comment': ''},
+    {'offset': 724, 'type': 'short', 'key': 'kin_trig_mode', 'comment': 'Kinetics Trigger Mode'},
+    {'offset': 726, 'type': 'char', 'key': 'dlabel[LABELMAX]', 'comment': 'Data label.'},
+    {'offset': 742, 'type': 'char', 'key': 'Spare_4[436]', 'comment': ''},
+    {'offset': 1178, 'type': 'char', 'key': 'PulseFileName[HDRNAMEMAX]', 'comment': 'Name of Pulser File with'},
+    {'offset': 1298, 'type': 'char', 'key': 'AbsorbFileName[HDRNAMEMAX]', 'comment': 'Name of Absorbance File (if File Mode)'},
+    {'offset': 1418, 'type': 'DWORD', 'key': 'NumExpRepeats', 'comment': 'Number of Times experiment repeated'},
+    {'offset': 1422, 'type': 'DWORD', 'key': 'NumExpAccums', 'comment': 'Number of Time experiment accumulated'},
+    {'offset': 1426, 'type': 'short', 'key': 'YT_Flag', 'comment': 'Set to 1 if this file contains YT data'},
+    {'offset': 1428, 'type': 'float', 'key': 'clkspd_us', 'comment': 'Vert Clock Speed in micro-sec'},
+    {'offset': 1432, 'type': 'short', 'key': 'HWaccumFlag', 'comment': 'set to 1 if accum done by Hardware.'},
+    {'offset': 1434, 'type': 'short', 'key': 'StoreSync', 'comment': 'set to 1 if store sync used'},
+    {'offset': 1436, 'type': 'short', 'key': 'BlemishApplied', 'comment': 'set to 1 if blemish removal applied'},
+    {'offset': 1438, 'type': 'short', 'key': 'CosmicApplied', 'comment': 'set to 1 if cosmic ray removal applied'},
+    {'offset': 1440, 'type': 'short', 'key': 'CosmicType', 'comment': 'if cosmic ray applied, this is type'},
+    {'offset': 1442, 'type': 'float', 'key': 'CosmicThreshold', 'comment': 'Threshold of cosmic ray removal.'},
+    {'offset': 1446, 'type': 'long', 'key': 'NumFrames', 'comment': 'number of frames in file.'},
+    {'offset': 1450, 'type': 'float', 'key': 'MaxIntensity', 'comment': 'max intensity of data (future)'},
+    {'offset': 1454, 'type': 'float', 'key': 'MinIntensity', 'comment': 'min intensity of data (future)'},
+    {'offset': 1458, 'type': 'char', 'key': 'ylabel[LABELMAX]', 'comment': 'y axis label.'},
+    {'offset': 1474, 'type': 'WORD', 'key': 'ShutterType', 'comment': 'shutter type.'},
+    {'offset': 1476, 'type': 'float', 'key': 'shutterComp', 'comment': 'shutter compensation time.'},
+    {'offset': 1480, 'type': 'WORD', 'key': 'readoutMode', 'comment': 'readout mode, full,kinetics, etc'},
+    {'offset': 1482, 'type': 'WORD', 'key': 'WindowSize', 'comment': 'window size for kinetics only.'},
+    {'offset': 1484, 'type': 'WORD', 'key': 'clkspd', 'comment': 'clock speed for kinetics & frame transfer'},
+    {'offset': 1486, 'type': 'WORD', 'key': 'interface_type', 'comment': 'computer interface'},
+    {'offset': 1488, 'type': 'short', 'key': 'NumROIsInExperiment', 'comment': 'May be more than the 10 allowed in'},
+    {'offset': 1490, 'type': 'char', 'key': 'Spare_5[16]', 'comment': ''},
+    {'offset': 1506, 'type': 'WORD', 'key': 'controllerNum', 'comment': 'if multiple controller system will'},
+    {'offset': 1508, 'type': 'WORD', 'key': 'SWmade', 'comment': 'Which software package created this file'},
+    {'offset': 1510, 'type': 'short', 'key': 'NumROI', 'comment': 'number of ROIs used. if 0 assume 1.'},
+    {'offset': 1632, 'type': 'char', 'key': 'FlatField[HDRNAMEMAX]', 'comment': 'Flat field file name.'},
+    {'offset': 1752, 'type': 'char', 'key': 'background[HDRNAMEMAX]', 'comment': 'background sub. file name.'},
+    {'offset': 1872, 'type': 'char', 'key': 'blemish[HDRNAMEMAX]', 'comment': 'blemish file name.'},
+    {'offset': 1992, 'type': 'float', 'key': 'file_header_ver', 'comment': 'version of this file header'},
+    {'offset': 1996, 'type': 'char', 'key': 'YT_Info[1000]', 'comment': '-2995  Reserved for YT information'},
+    {'offset': 2996, 'type': 'long', 'key': 'WinView_id', 'comment': '== 0x01234567L if file created by WinX'},
+    {'offset': 3000, 'type': 'double', 'key': 'offset', 'comment': 'offset for absolute data scaling'},
+    {'offset': 3008, 'type': 'double', 'key': 'factor', 'comment': 'factor for absolute data scaling'},
+    {'offset': 3016, 'type': 'char', 'key': 'current_unit', 'comment': 'selected scaling unit'},
+    {'offset': 3017, 'type': 'char', 'key': 'reserved1', 'comment': 'reserved'},
+    {'offset': 3018, 'type': 'char', 'key': 'string[40]', 'comment': 'special string for scaling'},
+    {'offset': 3058, 'type': 'char', 'key': 'reserved2[40]', 'comment': 'reserved'},
+    {'offset': 3098, 'type': 'char', 'key': 'calib_valid', 'comment': 'flag if calibration is valid'},
+    {'offset': 3099, 'type': 'char', 'key': 'input_unit', 'comment': 'current input units for'},
+    {'offset': 3100, 'type': 'char', 'key': 'polynom_unit', 'comment': 'linear UNIT and used'},
+    {'offset': 3101, 'type': 'char', 'key': 'polynom_order', 'comment': 'ORDER of calibration POLYNOM'},
+    {'offset': 3102, 'type': 'char', 'key': 'calib_count', 'comment': 'valid calibration data pairs'},
+    {'offset': 3103, 'type': 'double', 'key': 'pixel_position[10]', 'comment': 'pixel pos. of calibration data'},
+    {'offset': 3183, 'type': 'double', 'key': 'calib_value[10]', 'comment': 'calibration VALUE at above pos'},
+    {'offset': 3263, 'type': 'double', 'key': 'polynom_coeff[6]', 'comment': 'polynom COEFFICIENTS'},
+    {'offset': 3311, 'type': 'double', 'key': 'laser_position', 'comment': 'laser wavenumber for relativ WN'},
+    {'offset': 3319, 'type': 'char', 'key': 'reserved3', 'comment': 'reserved'},
+    {'offset': 3320, 'type': 'BYTE', 'key': 'new_calib_flag', 'comment': 'If set to 200, valid label below'},
+    {'offset': 3321, 'type': 'char', 'key': 'calib_label[81]', 'comment': "Calibration label (NULL term'd)"},
+    {'offset': 3402, 'type': 'char', 'key': 'expansion[87]', 'comment': 'Calibration Expansion area'},
+    {'offset': 3489, 'type': 'double', 'key': 'offset', 'comment': 'offset for absolute data scaling'},
+    {'offset': 3497, 'type': 'double', 'key': 'factor', 'comment': 'factor for absolute data scaling'},
+    {'offset': 3505, 'type': 'char', 'key': 'current_unit', 'comment': 'selected scaling unit'},
+    {'offset': 3506, 'type': 'char', 'key': 'reserved1', 'comment': 'reserved'},
+    {'offset': 3507, 'type': 'char', 'key': 'string[40]', 'comment': 'special string for scaling'},
+    {'offset': 3547, 'type': 'char', 'key': 'reserved2[40]', 'comment': 'reserved'},
+    {'offset': 3587, 'type': 'char', 'key': 'calib_valid', 'comment': 'flag if calibration is valid'},
+    {'offset': 3588, 'type': 'char', 'key': 'input_unit', 'comment': 'current input units for'},
+    {'offset': 3589, 'type': 'char', 'key': 'polynom_unit', 'comment': 'linear UNIT and used'},
+    {'offset': 3590, 'type': 'char', 'key': 'polynom_order', 'comment': 'ORDER of calibration POLYNOM'},
+    {'offset': 3591, 'type': 'char', 'key': 'calib_count', 'comment': 'valid calibration data pairs'},
+    {'offset': 3592, 'type': 'double', 'key': 'pixel_position[10]', 'comment': 'pixel pos. of calibration data'},
+    {'offset': 3672, 'type': 'double', 'key': 'calib_value[10]', 'comment': 'calibration VALUE at above pos'},
+    {'offset': 3752, 'type': 'double', 'key': 'polynom_coeff[6]', 'comment': 'polynom COEFFICIENTS'},
+    {'offset': 3800, 'type': 'double', 'key': 'laser_position', 'comment': 'laser wavenumber for relativ WN'},
+    {'offset': 3808, 'type': 'char', 'key': 'reserved3', 'comment': 'reserved'},
+    {'offset': 3809, 'type': 'BYTE', 'key': 'new_calib_flag', 'comment': 'If set to 200, valid label below'},
+    {'offset': 3810, 'type': 'char', 'key': 'calib_label[81]', 'comment': "Calibration label (NULL term'd)"},
+    {'offset': 3891, 'type': 'char', 'key': 'expansion[87]', 'comment': 'Calibration Expansion area'},
+    {'offset': 3978, 'type': 'char', 'key': 'Istring[40]', 'comment': 'special intensity scaling string'},
+    {'offset': 4018, 'type': 'char', 'key': 'Spare_6[25]', 'comment': ''},
+    {'offset': 4043, 'type': 'BYTE', 'key': 'SpecType', 'comment': 'spectrometer type (acton, spex, etc.)'},
+    {'offset': 4044, 'type': 'BYTE', 'key': 'SpecModel', 'comment': 'spectrometer model (type dependent)'},
+    {'offset': 4045, 'type': 'BYTE', 'key': 'PulseBurstUsed', 'comment': 'pulser burst mode on/off'},
+    {'offset': 4046, 'type': 'DWORD', 'key': 'PulseBurstCount', 'comment': 'pulser triggers per burst'},
+    {'offset': 4050, 'type': 'double', 'key': 'ulseBurstPeriod', 'comment': 'pulser burst period (in usec)'},
+    {'offset': 4058, 'type': 'BYTE', 'key': 'PulseBracketUsed', 'comment': 'pulser bracket pulsing on/off'},
+    {'offset': 4059, 'type': 'BYTE', 'key': 'PulseBracketType', 'comment': 'pulser bracket pulsing type'},
+    {'offset': 4060, 'type': 'double', 'key': 'PulseTimeConstFast', 'comment': 'pulser slow exponential time constant (in usec)'},
+    {'offset': 4068, 'type': 'double', 'key': 'PulseAmplitudeFast', 'comment': 'pulser fast exponential amplitude constant'},
+    {'offset': 4076, 'type': 'double', 'key': 'PulseTimeConstSlow', 'comment': 'pulser slow exponential time constant (in usec)'},
+    {'offset': 4084, 'type': 'double', 'key': 'PulseAmplitudeSlow', 'comment': 'pulser slow exponential amplitude constant'},
+    {'offset': 4094, 'type': 'short', 'key': 'AvGainUsed', 'comment': 'avalanche gain was used'},
+    {'offset': 4096, 'type': 'short', 'key': 'AvGain', 'comment': 'avalanche gain value'},
+    {'offset': 4098, 'type': 'short', 'key': 'lastvalue', 'comment': 'Always the LAST value in the header'},
+]